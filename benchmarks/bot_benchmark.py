@@ -0,0 +1,161 @@
+"""
+Startup and per-message cost of the bot's listing path.
+
+"records" is the current path (ListingRecord objects, no pandas). "pandas" is
+the DataFrame path the bot used before, kept here as the baseline: it imports
+pandas and renders each message from a DataFrame row. Every measurement runs in
+a fresh interpreter:
+
+    python -m benchmarks.bot_benchmark
+
+pandas is no longer in requirements.txt, so install it separately
+(pip install pandas) for the baseline; without it that path is skipped.
+"""
+from benchmarks.make_fixtures import FIXTURE_DIR
+from config.definitions import CAROUSELL_URL, ROOT_DIR
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+PATHS = {
+    "records": [
+        "telegram.ext",
+        "telegram_bot.listingRecord",
+        "telegram_bot.listingCache",
+        "telegram_bot.subscriptionMatcher",
+        "telegram_bot.sendQueue",
+    ],
+    "pandas": ["telegram.ext", "pandas"],
+}
+
+
+def load_listings(fixture="large_page"):
+    from benchmarks.parser_benchmark import load_response
+    from scraper.carousellResponseParser import CarousellResponseParser
+
+    return CarousellResponseParser(load_response(os.path.join(FIXTURE_DIR, fixture + ".html"))).parse()
+
+
+# the message format of the DataFrame-based bot
+def pandas_format_message(series):
+    return (
+        "["
+        + series["title"]
+        + "]("
+        + CAROUSELL_URL
+        + series["listing_url"]
+        + ")"
+        + ": S$"
+        + series["price"].astype(str)
+        + "\n Listed "
+        + series["age"]
+        + " ago by "
+        + "["
+        + series["seller_url"][3:-1]
+        + "]("
+        + CAROUSELL_URL
+        + series["seller_url"]
+        + ")"
+    )
+
+
+def render_records(listings, num):
+    from telegram_bot.listingCache import ListingCacheEntry
+    from telegram_bot.listingRecord import ListingRecord
+
+    entry = ListingCacheEntry(ListingRecord.from_dicts(listings))
+    return [listing.render() for listing in entry.cheapest(num)]
+
+
+def render_pandas(listings, num):
+    import pandas as pd
+
+    df = pd.DataFrame([
+        {
+            "title": listing["title"],
+            "listing_url": listing["listing_url"],
+            "price": None if listing["price_cents"] is None else listing["price_cents"] / 100,
+            "age": "5 minutes",
+            "seller_url": listing["seller_url"],
+        }
+        for listing in listings
+        if listing["title"] and listing["listing_url"] and listing["seller_url"]
+    ]).nsmallest(num, "price")
+    return [pandas_format_message(df.iloc[i]) for i in range(len(df))]
+
+
+# runs inside the child interpreter
+def measure(path, num, min_time):
+    import importlib
+    import resource
+    import time
+
+    start = time.perf_counter()
+    for module in PATHS[path]:
+        importlib.import_module(module)
+    import_seconds = time.perf_counter() - start
+    startup_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    listings = [
+        listing for listing in load_listings()
+        if listing["title"] and listing["listing_url"] and listing["seller_url"]
+    ]
+    render = render_records if path == "records" else render_pandas
+    render(listings, num)
+
+    messages = 0
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    while time.perf_counter() - wall_start < min_time:
+        messages += len(render(listings, num))
+    cpu_seconds = time.process_time() - cpu_start
+
+    return {
+        "path": path,
+        "import_seconds": import_seconds,
+        "startup_rss_kb": startup_rss_kb,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "cpu_us_per_message": cpu_seconds / messages * 1e6,
+    }
+
+
+def run_in_child(path, num, min_time):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bot_benchmark",
+         "--child", path, "--num", str(num), "--min-time", str(min_time)],
+        cwd=ROOT_DIR, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", nargs="+", default=list(PATHS))
+    parser.add_argument("--num", type=int, default=20, help="listings rendered per query, as in /cheapest 20")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds spent timing each path")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.num, args.min_time)))
+        return
+
+    print(f"{'path':<8} {'import':>9} {'startup rss':>12} {'peak rss':>10} {'cpu/message':>12}")
+    for path in args.paths:
+        if path == "pandas" and importlib.util.find_spec("pandas") is None:
+            print(f"{path:<8} skipped: pandas is not installed (pip install pandas)")
+            continue
+        try:
+            run = run_in_child(path, args.num, args.min_time)
+        except subprocess.CalledProcessError as e:
+            print(f"{path:<8} failed: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        print(f"{path:<8} {run['import_seconds'] * 1000:>7.0f}ms {run['startup_rss_kb']:>10}kB "
+              f"{run['peak_rss_kb']:>8}kB {run['cpu_us_per_message']:>10.1f}us")
+
+
+if __name__ == "__main__":
+    main()
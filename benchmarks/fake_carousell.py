@@ -0,0 +1,120 @@
+"""
+Local stand-in for the Carousell search pages, used to size the crawl profile
+without sending traffic to the real site.
+
+Every /search/<term>/?...&page=N request gets a generated result page, after an
+optional injected latency, and fails with a 503 at the given error rate:
+
+    python -m benchmarks.fake_carousell --port 8800 --latency 0.2 --error-rate 0.05
+
+With --arrival-rate, every term gets that many new listings per minute from the
+moment the server starts, newest first on page 1, with their ages counting up,
+instead of a fixed set of listings.
+
+Point the crawler at it with "base_url": "http://localhost:8800" in
+config/crawl_profile.json.
+"""
+from benchmarks.make_fixtures import make_card, make_page, render_page
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from scraper.carousellListing import format_age
+from urllib.parse import parse_qs, unquote, urlsplit
+import argparse
+import itertools
+import random
+import time
+import zlib
+
+# arriving listings get IDs growing with their arrival, and ending in a code of their term
+ARRIVAL_ID_BASE = 1000000000
+ARRIVAL_INDEX_OFFSET = 1000000
+
+
+class FakeCarousellHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    cards_per_page = 48
+    # new listings per term per minute, 0 for the fixed pages
+    arrival_rate = 0.0
+    started = time.time()
+    # first pages served, i.e. searches
+    searches = itertools.count()
+
+    # epoch time an arriving listing was posted
+    @classmethod
+    def arrived_at(cls, listing_id):
+        index = (listing_id - ARRIVAL_ID_BASE) // 1000 - ARRIVAL_INDEX_OFFSET
+        return cls.started + index * 60 / cls.arrival_rate
+
+    def arrival_page(self, term, page):
+        now = time.time()
+        term_code = zlib.crc32(term.encode()) % 1000
+        newest = int((now - self.started) * self.arrival_rate / 60) - (page - 1) * self.cards_per_page
+        cards = []
+        for index in range(newest, newest - self.cards_per_page, -1):
+            listing_id = ARRIVAL_ID_BASE + (index + ARRIVAL_INDEX_OFFSET) * 1000 + term_code
+            # a listing looks the same on every scrape, only its age changes
+            age = format_age(self.arrived_at(listing_id), now)
+            cards.append(make_card(random.Random(listing_id), listing_id, age=age))
+        return render_page(term, cards)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "search":
+            self.send_error(404)
+            return
+
+        time.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0))
+        if random.random() < self.error_rate:
+            self.send_error(503)
+            return
+
+        term = unquote(parts[1])
+        page = int(parse_qs(url.query).get("page", ["1"])[0])
+        if page == 1:
+            next(self.searches)
+        if self.arrival_rate:
+            body = self.arrival_page(term, page).encode("utf-8")
+        else:
+            # the same term and page always give the same listings
+            seed = zlib.crc32(f"{term}/{page}".encode()) % 10000
+            body = make_page(term, self.cards_per_page, seed, bumped=lambda i: i % 7 == 0).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random +/- seconds around the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 503")
+    parser.add_argument("--cards", type=int, default=48, help="listings per result page")
+    parser.add_argument("--arrival-rate", type=float, default=0.0, help="new listings per term per minute")
+    args = parser.parse_args()
+
+    FakeCarousellHandler.latency = args.latency
+    FakeCarousellHandler.jitter = args.jitter
+    FakeCarousellHandler.error_rate = args.error_rate
+    FakeCarousellHandler.cards_per_page = args.cards
+    FakeCarousellHandler.arrival_rate = args.arrival_rate
+    FakeCarousellHandler.started = time.time()
+
+    server = ThreadingHTTPServer(("localhost", args.port), FakeCarousellHandler)
+    print(f"Serving fake Carousell on http://localhost:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Local stand-in for the Telegram Bot API, so the bot can be load tested without
+sending real messages.
+
+getUpdates is answered as a long poll without updates, getMe with a made-up
+bot, and any other method with a plain success. Every sendMessage is recorded.
+Like Telegram, it answers with 429 Too Many Requests and a retry_after once a
+chat gets more than --chat-rate messages in a second, or all chats together
+more than --global-rate:
+
+    python -m benchmarks.fake_telegram --port 8801
+
+Point the bot at it with CAROUSELL_TELEGRAM_API_URL=http://localhost:8801/bot.
+"""
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import threading
+import time
+
+
+class DeliveryLog():
+    """
+    Messages accepted by the fake API and requests turned away with a 429,
+    with sliding one-second windows for the rate limits.
+    """
+
+    def __init__(self, chat_rate=1, global_rate=30, retry_after=1):
+        self.chat_rate = chat_rate
+        self.global_rate = global_rate
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        # (delivered_at, chat_id, text)
+        self.deliveries = []
+        self.flood_limited = 0
+        self.recent = deque()
+        self.chat_recent = {}
+
+    # records the message, or returns the seconds to wait when over a limit
+    def deliver(self, chat_id, text):
+        with self.lock:
+            now = time.time()
+            chat_recent = self.chat_recent.setdefault(chat_id, deque())
+            for window in (self.recent, chat_recent):
+                while window and window[0] <= now - 1:
+                    window.popleft()
+            if len(chat_recent) >= self.chat_rate or len(self.recent) >= self.global_rate:
+                self.flood_limited += 1
+                return self.retry_after
+            chat_recent.append(now)
+            self.recent.append(now)
+            self.deliveries.append((now, chat_id, text))
+            return None
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    log = DeliveryLog()
+    # longest wait before answering getUpdates with no updates
+    poll_interval = 1.0
+    message_ids = iter(range(1, 1 << 62))
+
+    def do_POST(self):
+        # /bot<token>/<method>
+        method = self.path.rstrip("/").rsplit("/", 1)[-1]
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        try:
+            params = json.loads(body) if body else {}
+        except ValueError:
+            params = {}
+
+        if method == "getUpdates":
+            time.sleep(min(float(params.get("timeout", 0)), self.poll_interval))
+            self.reply(200, {"ok": True, "result": []})
+        elif method == "getMe":
+            self.reply(200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}})
+        elif method == "sendMessage":
+            self.send_message(params)
+        else:
+            self.reply(200, {"ok": True, "result": True})
+
+    do_GET = do_POST
+
+    def send_message(self, params):
+        chat_id = int(params["chat_id"])
+        retry_after = self.log.deliver(chat_id, params.get("text", ""))
+        if retry_after is not None:
+            self.reply(429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            })
+            return
+        self.reply(200, {"ok": True, "result": {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", ""),
+        }})
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8801)
+    parser.add_argument("--chat-rate", type=int, default=1, help="messages per second one chat may get")
+    parser.add_argument("--global-rate", type=int, default=30, help="messages per second all chats together may get")
+    parser.add_argument("--retry-after", type=int, default=1, help="seconds asked to wait after a 429")
+    args = parser.parse_args()
+
+    FakeTelegramHandler.log = DeliveryLog(args.chat_rate, args.global_rate, args.retry_after)
+    server = ThreadingHTTPServer(("localhost", args.port), FakeTelegramHandler)
+    print(f"Serving fake Bot API on http://localhost:{args.port}/bot")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    log = FakeTelegramHandler.log
+    print(f"{len(log.deliveries)} messages delivered, {log.flood_limited} answered with 429")
+
+
+if __name__ == "__main__":
+    main()
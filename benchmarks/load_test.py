@@ -0,0 +1,172 @@
+"""
+Load test of the whole pipeline, scraper daemon to bot to Bot API, against
+local stand-ins for Carousell and Telegram.
+
+A fresh data directory gets `--users` users with `--searches` searches each,
+drawn from `--terms` distinct terms. The fake Carousell posts `--arrival-rate`
+new listings per term per minute, and the fake Bot API enforces Telegram's
+flood limits. The bot (main.py) and the scraper (scrape_daemon.py) run as they
+would in production, pointed at the stand-ins through CAROUSELL_* variables:
+
+    python -m benchmarks.load_test --users 200 --searches 3 --terms 50 --duration 180
+
+It reports searches per minute, notifications per second, 429s and the delay
+from a listing being posted to its notification being delivered.
+"""
+from benchmarks.fake_carousell import FakeCarousellHandler
+from benchmarks.fake_telegram import DeliveryLog, FakeTelegramHandler
+from benchmarks.shard_benchmark import free_port
+from config.definitions import ROOT_DIR
+from http.server import ThreadingHTTPServer
+from scraper.carousellSubscriptionStore import CarousellSubscriptionStore
+import argparse
+import json
+import os
+import random
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+LISTING_LINK_PATTERN = re.compile(r"/p/[^)\s]*-(\d{10})/")
+
+
+def serve(handler):
+    server = ThreadingHTTPServer(("localhost", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def seed_users(data_dir, users, searches, terms):
+    store = CarousellSubscriptionStore(os.path.join(data_dir, "subscriptions.db"), json_path=None)
+    term_pool = [f"load test item {i}" for i in range(terms)]
+    for user_id in range(1, users + 1):
+        for term in random.Random(user_id).sample(term_pool, min(searches, terms)):
+            store.upsert(user_id, term)
+
+
+def start(command, env, log_path):
+    log = open(log_path, "w") if log_path else subprocess.DEVNULL
+    return subprocess.Popen(
+        [sys.executable] + command, cwd=ROOT_DIR, env=env,
+        stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+    )
+
+
+def stop(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+# delay from posting to delivery of every listing notified, sorted
+def notification_delays(deliveries, started):
+    delays = []
+    for delivered_at, _, text in deliveries:
+        for listing_id in LISTING_LINK_PATTERN.findall(text):
+            arrived_at = FakeCarousellHandler.arrived_at(int(listing_id))
+            # listings posted before the run are only there to fill the first page
+            if arrived_at >= started:
+                delays.append(delivered_at - arrived_at)
+    return sorted(delays)
+
+
+def report(args, searches, deliveries, flood_limited, started, ended):
+    minutes = (ended - started) / 60
+    delays = notification_delays(deliveries, started)
+    print(f"duration            {ended - started:.0f}s")
+    print(f"searches per minute {searches / minutes:.1f}")
+    print(f"messages per second {len(deliveries) / (ended - started):.2f}")
+    print(f"notifications/s     {len(delays) / (ended - started):.2f} ({len(delays)} listings delivered)")
+    print(f"429 responses       {flood_limited}")
+    if delays:
+        print(
+            "posted -> notified  "
+            f"p50 {percentile(delays, 0.5):.1f}s  p90 {percentile(delays, 0.9):.1f}s  "
+            f"p99 {percentile(delays, 0.99):.1f}s  max {delays[-1]:.1f}s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--searches", type=int, default=3, help="searches per user")
+    parser.add_argument("--terms", type=int, default=30, help="distinct search terms the searches are drawn from")
+    parser.add_argument("--arrival-rate", type=float, default=2.0, help="new listings per term per minute")
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds added to every fake Carousell response")
+    parser.add_argument("--chat-rate", type=int, default=1, help="Bot API messages per second per chat")
+    parser.add_argument("--global-rate", type=int, default=30, help="Bot API messages per second overall")
+    parser.add_argument("--workers", type=int, default=0, help="scraper worker processes, 0 for the single daemon")
+    parser.add_argument("--duration", type=float, default=180, help="seconds to run for")
+    parser.add_argument("--logs", default=None, help="directory to keep the bot and scraper logs in")
+    args = parser.parse_args()
+
+    FakeCarousellHandler.latency = args.latency
+    FakeCarousellHandler.arrival_rate = args.arrival_rate
+    FakeCarousellHandler.started = time.time()
+    FakeTelegramHandler.log = DeliveryLog(args.chat_rate, args.global_rate)
+    carousell = serve(FakeCarousellHandler)
+    telegram = serve(FakeTelegramHandler)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        seed_users(data_dir, args.users, args.searches, args.terms)
+        token_path = os.path.join(data_dir, "token.txt")
+        with open(token_path, "w") as f:
+            f.write("123456:load-test-token\n")
+        profile_path = os.path.join(data_dir, "crawl_profile.json")
+        with open(profile_path, "w") as f:
+            json.dump({"base_url": f"http://localhost:{carousell.server_address[1]}"}, f)
+        env = dict(
+            os.environ,
+            CAROUSELL_DATA_DIR=data_dir,
+            CAROUSELL_TOKEN_PATH=token_path,
+            CAROUSELL_TELEGRAM_API_URL=f"http://localhost:{telegram.server_address[1]}/bot",
+            CAROUSELL_IPC_PORT=str(free_port()),
+        )
+        if args.logs:
+            os.makedirs(args.logs, exist_ok=True)
+
+        bot = start(["main.py"], env, args.logs and os.path.join(args.logs, "bot.log"))
+        # give the bot time to start listening before the scraper sends its first event
+        time.sleep(5)
+        scraper_command = ["scrape_daemon.py", "--crawl-profile", profile_path]
+        if args.workers:
+            scraper_command += ["--workers", str(args.workers), "--coordinator", f"localhost:{free_port()}"]
+        scraper = start(scraper_command, env, args.logs and os.path.join(args.logs, "scraper.log"))
+
+        started = time.time()
+        searches_before = next(FakeCarousellHandler.searches)
+        try:
+            time.sleep(args.duration)
+        finally:
+            ended = time.time()
+            searches = next(FakeCarousellHandler.searches) - searches_before - 1
+            stop(scraper)
+            stop(bot)
+
+    log = FakeTelegramHandler.log
+    with log.lock:
+        deliveries = list(log.deliveries)
+        flood_limited = log.flood_limited
+    carousell.shutdown()
+    telegram.shutdown()
+    print(f"{args.users} users x {args.searches} searches over {args.terms} terms, "
+          f"{args.arrival_rate:g} new listings per term per minute")
+    report(args, searches, deliveries, flood_limited, started, ended)
+
+
+if __name__ == "__main__":
+    main()
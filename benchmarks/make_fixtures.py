@@ -0,0 +1,116 @@
+from config.definitions import ROOT_DIR
+import json
+import os
+import random
+import re
+
+FIXTURE_DIR = os.path.join(ROOT_DIR, "benchmarks", "fixtures")
+
+# synthetic pages, nothing here is captured from the live site: the markup
+# imitates the layout of a server-rendered carousell.sg search page, and the
+# state blob's keys are made up to match it
+PAGE_TEMPLATE = """<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{query} | Carousell Singapore</title><link rel="stylesheet" href="/static/app.css"><script src="/static/app.js"></script></head><body><div id="root"><header class="D_a"><nav class="D_b"><a href="/">Carousell</a><form action="/search"><input name="q" value="{query}"></form></nav></header><main><div class="D_c"><div class="D_d"><h1>{query}</h1><p>{count} results</p></div><div class="D_e">{cards}</div><button class="D_f" type="button">Show more results</button></div></main><footer class="D_g"><p>Carousell</p></footer></div>{state}</body></html>"""
+
+CARD_TEMPLATE = """<div class="D_h" data-testid="listing-card-{listing_id}"><div class="D_i"><a class="D_j" href="/u/{seller}/"><div class="D_k"><img alt="{seller}" src="/img/u/{seller}.jpg"></div><div class="D_l"><p class="D_m" data-testid="listing-card-text-seller-name">{seller}</p><div class="D_n"><p class="D_o">{age} ago</p>{bump}</div></div></a></div><div class="D_p"><a class="D_q" href="/p/{slug}-{listing_id}/?t-id=abc&amp;t-referrer_request_id=def"><div class="D_r"><img alt="{title}" src="/img/p/{listing_id}.jpg"></div><p class="D_s" title="{title}">{title}</p><div class="D_t"><p class="D_u" title="{price}">{price}</p>{stricken}</div><p class="D_v">{condition}</p></a><div class="D_w"><button aria-label="Like" type="button"><svg viewBox="0 0 24 24"><path d="M0 0"></path></svg><span>{likes}</span></button></div></div></div>"""
+
+# the listing data the front end is hydrated from, as embedded after the markup
+STATE_TEMPLATE = """<script>window.initialState = {state};</script>"""
+
+BUMP_ICON = '<svg class="D_x" viewBox="0 0 16 16"><path d="M8 0L16 8"></path></svg>'
+
+AGES = ["30 seconds", "1 minute", "12 minutes", "3 hours", "1 day", "5 days", "2 months", "1 year"]
+CONDITIONS = ["Brand new", "Like new", "Lightly used", "Well used"]
+WORDS = ["iphone", "15", "pro", "max", "256gb", "blue", "mint", "condition", "warranty", "ipad", "mini", "case", "charger"]
+
+# how each card deviates from a plain listing
+MALFORMATIONS = ["no_listing_anchor", "no_price", "bad_price", "no_seller", "no_title"]
+
+
+# returns the card's markup and its entry in the page's state blob
+# age: e.g. "5 minutes", picked at random when not given
+def make_card(rng, listing_id, bumped=False, stricken=False, free=False, malformed=None, age=None):
+    title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 7))).title()
+    price = rng.randint(5, 3000)
+    seller = f"seller_{rng.randint(1, 500)}"
+    random_age = rng.choice(AGES)
+    age = random_age if age is None else age
+    slug = title.lower().replace(" ", "-")
+    price_text = "FREE" if free else f"S${price:,}"
+    stricken_text = f"S${price + rng.randint(10, 200):,}" if stricken else None
+    condition = rng.choice(CONDITIONS)
+    likes = rng.randint(0, 40)
+    card = CARD_TEMPLATE.format(
+        listing_id=listing_id,
+        seller=seller,
+        age=age,
+        bump=BUMP_ICON if bumped else "",
+        slug=slug,
+        title=title,
+        price=price_text,
+        stricken=f"<s>{stricken_text}</s>" if stricken else "",
+        condition=condition,
+        likes=likes,
+    )
+    # the state blob is not affected by broken markup
+    state = {
+        "id": str(listing_id),
+        "title": title,
+        "price": price_text,
+        "originalPrice": stricken_text,
+        "listingUrl": f"/p/{slug}-{listing_id}/?t-id=abc&t-referrer_request_id=def",
+        "seller": {"username": seller, "profileUrl": f"/u/{seller}/"},
+        "timeAgo": f"{age} ago",
+        "isBumped": bool(bumped),
+        "condition": condition,
+        "likesCount": likes,
+    }
+
+    if malformed == "no_listing_anchor":
+        card = card.replace('href="/p/', 'href="/x/')
+    elif malformed == "no_price":
+        card = re.sub(r'<p class="D_u".*?</p>', "", card)
+    elif malformed == "bad_price":
+        card = card.replace(">S$", ">S$ about ", 1)
+    elif malformed == "no_seller":
+        card = card.replace(' data-testid="listing-card-text-seller-name"', "")
+    elif malformed == "no_title":
+        card = re.sub(r'<p class="D_s".*?</p>', "", card)
+    return card, state
+
+
+# embed_state: whether the page carries the state blob, as server-rendered pages do
+def make_page(query, num_cards, seed, embed_state=True, **card_options):
+    rng = random.Random(seed)
+    cards = []
+    for i in range(num_cards):
+        options = {key: value(i) if callable(value) else value for key, value in card_options.items()}
+        cards.append(make_card(rng, 1200000000 + seed * 10000 + i, **options))
+    return render_page(query, cards, embed_state)
+
+
+# cards: (markup, state) pairs from make_card
+def render_page(query, cards, embed_state=True):
+    state = ""
+    if embed_state:
+        state_json = json.dumps({"searchListing": {"query": query, "listingCards": [card[1] for card in cards]}})
+        state = STATE_TEMPLATE.format(state=state_json.replace("</", "<\\/"))
+    return PAGE_TEMPLATE.format(query=query, count=len(cards), cards="".join(card[0] for card in cards), state=state)
+
+
+FIXTURES = {
+    "small_page": lambda: make_page("ipad mini", 12, seed=1, bumped=lambda i: i % 5 == 0, stricken=lambda i: i % 4 == 0),
+    "large_page": lambda: make_page("iphone", 400, seed=2, bumped=lambda i: i % 7 == 0, stricken=lambda i: i % 6 == 0, free=lambda i: i % 50 == 0),
+    "bumped_listings": lambda: make_page("nintendo switch", 48, seed=3, bumped=True),
+    "stricken_prices": lambda: make_page("aeron chair", 48, seed=4, stricken=True),
+    "free_items": lambda: make_page("free", 48, seed=5, free=True),
+    "malformed_cards": lambda: make_page("lego", 50, seed=6, malformed=lambda i: MALFORMATIONS[i % len(MALFORMATIONS)] if i % 2 else None),
+    "no_state_blob": lambda: make_page("ipad", 48, seed=7, embed_state=False, bumped=lambda i: i % 5 == 0),
+}
+
+
+if __name__ == "__main__":
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for name, make in FIXTURES.items():
+        with open(os.path.join(FIXTURE_DIR, f"{name}.html"), "w", encoding="utf-8") as f:
+            f.write(make())
+        print(f"Wrote {name}.html")
@@ -0,0 +1,214 @@
+"""
+Offline benchmark for CarousellResponseParser.
+
+Every parser engine is run over the synthetic search pages in benchmarks/fixtures
+(see benchmarks/make_fixtures.py, they are not captured from carousell.sg),
+each (engine, fixture) pair in a fresh interpreter so peak RSS is not shared.
+Results are written as JSON so runs can be compared across commits:
+
+    python -m benchmarks.parser_benchmark
+    python -m benchmarks.parser_benchmark --compare benchmarks/results/<commit>.json
+
+Before timing, the "json" engine's listings are cross-checked field by field
+against the DOM parser's on every fixture. --check-only stops after that, and
+exits with an error on any mismatch outside the malformed-markup fixture.
+"""
+from benchmarks.make_fixtures import FIXTURE_DIR
+from config.definitions import ROOT_DIR
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+# fixtures with deliberately broken card markup, where the DOM parser is expected
+# to lose or misread fields: their differences are listed but not counted
+BROKEN_MARKUP_FIXTURES = {"malformed_cards"}
+
+
+def load_response(fixture_path):
+    from scrapy.http import HtmlResponse
+
+    with open(fixture_path, "rb") as f:
+        body = f.read()
+    return HtmlResponse(url="https://www.carousell.sg/search/benchmark", body=body, encoding="utf-8")
+
+
+# runs inside the child interpreter, returns the measurements for one pair
+def measure(engine, fixture_path, min_time):
+    from scraper.carousellResponseParser import CarousellResponseParser
+    import resource
+    import time
+    import tracemalloc
+
+    response = load_response(fixture_path)
+    rss_before_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # warm up caches and compiled patterns
+    cards = len(CarousellResponseParser(response, engine=engine).parse())
+
+    iterations = 0
+    start = time.perf_counter()
+    elapsed = 0
+    while elapsed < min_time:
+        CarousellResponseParser(response, engine=engine).parse()
+        iterations += 1
+        elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    result = CarousellResponseParser(response, engine=engine).parse()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    retained_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+    del result
+
+    per_card = max(cards, 1)
+    return {
+        "engine": engine,
+        "fixture": os.path.splitext(os.path.basename(fixture_path))[0],
+        "cards": cards,
+        "iterations": iterations,
+        "seconds_per_page": elapsed / iterations,
+        "cards_per_second": cards * iterations / elapsed,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "parse_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before_kb,
+        "peak_alloc_bytes_per_card": peak_bytes / per_card,
+        "retained_blocks_per_card": retained_blocks / per_card,
+    }
+
+
+# compares the state blob parser with the DOM parser on one fixture
+def cross_check(fixture_path, scraped_at=1700000000):
+    from scraper.carousellJsonParser import CarousellJsonParser
+    from scraper.carousellListing import LISTING_FIELDS
+    from scraper.carousellLxmlParser import CarousellLxmlParser
+
+    response = load_response(fixture_path)
+    json_items = CarousellJsonParser(response.body, scraped_at).parse()
+    if json_items is None:
+        return None
+    dom_items = {item["listing_id"]: item for item in CarousellLxmlParser(response.text, scraped_at).parse()}
+    check = {"cards": len(json_items), "agree": 0, "missing_from_dom": 0, "mismatches": []}
+    for json_item in json_items:
+        dom_item = dom_items.pop(json_item["listing_id"], None)
+        if dom_item is None:
+            check["mismatches"].append((json_item["listing_id"], "card", "only in the state blob"))
+            continue
+        for field in LISTING_FIELDS:
+            if json_item[field] == dom_item[field]:
+                check["agree"] += 1
+            elif dom_item[field] in (None, False):
+                # broken markup loses fields the blob still has
+                check["missing_from_dom"] += 1
+            else:
+                check["mismatches"].append((json_item["listing_id"], field, f"{json_item[field]!r} != {dom_item[field]!r}"))
+    for listing_id in dom_items:
+        check["mismatches"].append((listing_id, "card", "only in the markup"))
+    return check
+
+
+def run_in_child(engine, fixture_path, min_time):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.parser_benchmark",
+         "--child", engine, fixture_path, "--min-time", str(min_time)],
+        cwd=ROOT_DIR, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR, check=True, capture_output=True, text=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=ROOT_DIR, check=True, capture_output=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def compare(results, old_path):
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    old_runs = {(run["fixture"], run["engine"]): run for run in old["runs"]}
+    print(f"\nCompared to {old['commit']}:")
+    for run in results["runs"]:
+        previous = old_runs.get((run["fixture"], run["engine"]))
+        if previous is None:
+            continue
+        speedup = run["cards_per_second"] / previous["cards_per_second"]
+        print(f"  {run['fixture']:<18} {run['engine']:<6} {speedup:6.2f}x cards/s")
+
+
+def main():
+    from scraper.carousellResponseParser import PARSER_ENGINES
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engines", nargs="+", default=list(PARSER_ENGINES))
+    parser.add_argument("--fixtures", nargs="+", default=None, help="fixture names, defaults to all")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds spent timing each pair")
+    parser.add_argument("--output", default=None, help="defaults to benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", default=None, help="previous results file to compare against")
+    parser.add_argument("--check-only", action="store_true", help="only cross-check the json engine against the DOM")
+    parser.add_argument("--child", nargs=2, metavar=("ENGINE", "FIXTURE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child[0], args.child[1], args.min_time)))
+        return
+
+    fixture_names = args.fixtures or sorted(
+        os.path.splitext(name)[0] for name in os.listdir(FIXTURE_DIR) if name.endswith(".html")
+    )
+
+    mismatches = 0
+    for name in fixture_names:
+        check = cross_check(os.path.join(FIXTURE_DIR, name + ".html"))
+        if check is None:
+            print(f"cross-check {name:<18} no state blob, json falls back to the DOM")
+            continue
+        if name not in BROKEN_MARKUP_FIXTURES:
+            mismatches += len(check["mismatches"])
+        print(f"cross-check {name:<18} {check['cards']:>4} cards, {check['agree']:>5} fields agree, "
+              f"{check['missing_from_dom']:>3} missing from the DOM, {len(check['mismatches'])} mismatched")
+        for listing_id, field, problem in check["mismatches"]:
+            print(f"    {listing_id} {field}: {problem}")
+    if args.check_only:
+        sys.exit(1 if mismatches else 0)
+    print()
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "runs": [],
+    }
+
+    print(f"{'fixture':<18} {'engine':<6} {'cards':>5} {'cards/s':>10} {'peak rss':>10} {'alloc B/card':>13}")
+    for name in fixture_names:
+        for engine in args.engines:
+            run = run_in_child(engine, os.path.join(FIXTURE_DIR, name + ".html"), args.min_time)
+            results["runs"].append(run)
+            print(f"{name:<18} {engine:<6} {run['cards']:>5} {run['cards_per_second']:>10.0f} "
+                  f"{run['peak_rss_kb']:>8}kB {run['peak_alloc_bytes_per_card']:>13.0f}")
+
+    output = args.output or os.path.join(RESULTS_DIR, results["commit"] + ".json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
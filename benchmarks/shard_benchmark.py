@@ -0,0 +1,106 @@
+"""
+End-to-end run of the sharded scraper against the local fake Carousell.
+
+For each worker count, a fresh data directory is seeded with `--terms`
+subscriptions and `scrape_daemon.py --workers N` is started against it. The run
+ends once every term has been scraped into the shared listing store:
+
+    python -m benchmarks.shard_benchmark --workers 1 2 4 --terms 200 --latency 0.2
+"""
+from benchmarks.fake_carousell import FakeCarousellHandler
+from config.definitions import ROOT_DIR
+from http.server import ThreadingHTTPServer
+from scraper.carousellSubscriptionStore import CarousellSubscriptionStore
+import argparse
+import json
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def seed_data_dir(data_dir, terms, base_url):
+    store = CarousellSubscriptionStore(os.path.join(data_dir, "subscriptions.db"), json_path=None)
+    for i in range(terms):
+        store.upsert(i, f"benchmark item {i}")
+    profile_path = os.path.join(data_dir, "crawl_profile.json")
+    with open(profile_path, "w", encoding="utf-8") as f:
+        json.dump({"base_url": base_url}, f)
+    return profile_path
+
+
+def scraped_terms(data_dir):
+    db_path = os.path.join(data_dir, "listings.db")
+    if not os.path.exists(db_path):
+        return 0
+    try:
+        with sqlite3.connect(db_path, timeout=10) as conn:
+            return conn.execute("SELECT COUNT(DISTINCT term) FROM scrapes").fetchone()[0]
+    except sqlite3.OperationalError:
+        # the workers have not created the tables yet
+        return 0
+
+
+# seconds until every term has been scraped once, None on timeout
+def run(workers, terms, base_url, timeout):
+    with tempfile.TemporaryDirectory() as data_dir:
+        profile_path = seed_data_dir(data_dir, terms, base_url)
+        process = subprocess.Popen(
+            [sys.executable, "scrape_daemon.py", "--workers", str(workers),
+             "--coordinator", f"localhost:{free_port()}", "--crawl-profile", profile_path],
+            cwd=ROOT_DIR,
+            env=dict(os.environ, CAROUSELL_DATA_DIR=data_dir),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        start = time.perf_counter()
+        try:
+            while time.perf_counter() - start < timeout:
+                if scraped_terms(data_dir) >= terms:
+                    return time.perf_counter() - start
+                time.sleep(0.2)
+            return None
+        finally:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--terms", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds added to every fake response")
+    parser.add_argument("--cards", type=int, default=48, help="listings per result page")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    FakeCarousellHandler.latency = args.latency
+    FakeCarousellHandler.cards_per_page = args.cards
+    server = ThreadingHTTPServer(("localhost", 0), FakeCarousellHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://localhost:{server.server_address[1]}"
+
+    print(f"{'workers':>7} {'seconds':>9} {'terms/s':>8}")
+    for workers in args.workers:
+        seconds = run(workers, args.terms, base_url, args.timeout)
+        if seconds is None:
+            print(f"{workers:>7} timed out after {args.timeout:.0f}s")
+            continue
+        print(f"{workers:>7} {seconds:>9.1f} {args.terms / seconds:>8.1f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
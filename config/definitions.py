@@ -2,4 +2,66 @@ import os
 
 ROOT_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), ".."))
 CAROUSELL_URL = "https://www.carousell.sg"
-TOKEN_DIR = os.path.join(ROOT_DIR, "config", "token.txt")
+# the CAROUSELL_* environment variables point a test run at its own token, fake
+# Bot API, bot connection and stores (see benchmarks/load_test.py)
+TOKEN_DIR = os.environ.get("CAROUSELL_TOKEN_PATH", os.path.join(ROOT_DIR, "config", "token.txt"))
+TELEGRAM_API_URL = os.environ.get("CAROUSELL_TELEGRAM_API_URL", "https://api.telegram.org/bot")
+IPC_ADDRESS = ("localhost", int(os.environ.get("CAROUSELL_IPC_PORT", 6000)))
+IPC_KEY_DIR = os.path.join(ROOT_DIR, "config", "ipc_key")
+# scraper workers connect here to be given their share of the search terms
+SHARD_COORDINATOR_ADDRESS = ("localhost", 6001)
+DATA_DIR = os.environ.get("CAROUSELL_DATA_DIR", os.path.join(ROOT_DIR, "data"))
+# only read once, to import it into SUBSCRIPTION_DB_PATH
+MONITORED_SEARCHES_PATH = os.path.join(DATA_DIR, "monitored_searches.json")
+SUBSCRIPTION_DB_PATH = os.path.join(DATA_DIR, "subscriptions.db")
+LISTING_DB_PATH = os.path.join(DATA_DIR, "listings.db")
+CRAWL_PROFILE_PATH = os.path.join(ROOT_DIR, "config", "crawl_profile.json")
+METRICS_DIR = os.path.join(DATA_DIR, "metrics")
+
+USER_AGENT = "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/118.0"
+TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
+
+# bounds (in seconds) on how often the scrape daemon re-scrapes each search term
+MIN_SCRAPE_INTERVAL = 30
+MAX_SCRAPE_INTERVAL = 15 * 60
+# interval a term is assumed to want before its rate is known, the fixed
+# one-minute cadence the scrape daemon replaced
+PRIOR_SCRAPE_INTERVAL = 60
+# search requests per minute shared by all terms
+SCRAPE_BUDGET = 60
+
+# "lxml" is the single-pass extraction engine, "bs4" the original BeautifulSoup parser,
+# "json" reads the state blob embedded in the page and falls back to "lxml" without
+# one; it stays opt-in until its keys are checked against a page captured from the site
+PARSER_ENGINE = "lxml"
+
+# number of listing IDs remembered per search to decide which listings are new
+SEEN_INDEX_RETENTION = 5000
+# number of listings per search whose price and bumps are tracked for alerts
+LISTING_STATE_RETENTION = 20000
+
+# how many search result pages are followed per term, and how many of them at once.
+# Deeper pages are requested with "&page=N", which only the fake server is known to
+# honour; raise MAX_SEARCH_PAGES once it is checked against the live site, or every
+# deeper page may just be page 1 again
+MAX_SEARCH_PAGES = 1
+SEARCH_PAGE_WINDOW = 2
+
+# seconds between two writes of data/metrics/<process>.json
+METRICS_FLUSH_INTERVAL = 15
+# local ports serving Prometheus text at /metrics
+SCRAPER_METRICS_PORT = 9101
+BOT_METRICS_PORT = 9102
+
+# points per scraper worker on the shard ring, more points spread the terms more evenly
+SHARD_VIRTUAL_NODES = 64
+
+# threads running the push of different terms at once
+PUSH_WORKERS = 8
+# threads delivering queued messages, so a slow chat only holds up its own thread
+SEND_WORKERS = 16
+
+# listings pushed to each user that are remembered, so overlapping searches push a listing once
+NOTIFIED_RETENTION = 200000
+# seconds before another bump of the same listing is pushed to the same user
+BUMP_RENOTIFY_SECONDS = 60 * 60
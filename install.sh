@@ -17,7 +17,7 @@ pip install -r requirements.txt
 
 # create cron scripts
 echo "Creating cron scripts..."
-echo "source $PWD/scraper_venv/bin/activate && python $PWD/scrape_once.py && sleep 5s && python $PWD/push_to_users.py" > cron_scrape.sh
+echo "source $PWD/scraper_venv/bin/activate && python $PWD/scrape_daemon.py" > start_scraper.sh
 echo "source $PWD/scraper_venv/bin/activate && python $PWD/main.py" > start_bot.sh
 
 read -p "Do you want to set the recommended cron jobs? (y/n) " answer
@@ -26,7 +26,7 @@ if [ "$answer" == "y" ]; then
     # write out current crontab
     crontab -l > mycron
     # echo new cron into cron file
-    echo "* * * * * bash $PWD/cron_scrape.sh >> $PWD/scraper_logs.log 2>&1" >> mycron
+    echo "@reboot bash $PWD/start_scraper.sh >> $PWD/scraper_logs.log 2>&1" >> mycron
     echo "@reboot bash $PWD/start_bot.sh >> $PWD/bot_logs.log 2>&1" >> mycron
     # install new cron file
     crontab mycron
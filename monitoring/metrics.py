@@ -0,0 +1,216 @@
+from config.definitions import METRICS_DIR, METRICS_FLUSH_INTERVAL
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# upper bounds in seconds, from fast local work up to slow fetches and sends
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# end-to-end delays between a listing being seen and its notification being delivered
+DELAY_BUCKETS = (1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+COUNT_BUCKETS = (0, 1, 5, 10, 20, 30, 40, 50, 75, 100, 200, 500)
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter():
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def prometheus_lines(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in self.values.items():
+                lines.append(f"{self.name}{format_labels(key)} {value}")
+        return lines
+
+    def snapshot(self):
+        with self.lock:
+            return {format_labels(key) or "total": value for key, value in self.values.items()}
+
+
+class Histogram():
+
+    def __init__(self, name, description, buckets=TIME_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # label key -> [per-bucket counts (last one is +Inf), sum, count]
+        self.values = {}
+
+    def observe(self, value, **labels):
+        if value is None:
+            return
+        key = label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    # with histogram.time(): ... observes the seconds spent in the block
+    def time(self, **labels):
+        return Timer(self, labels)
+
+    def prometheus_lines(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total, count) in self.values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{format_labels(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_sum{format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{format_labels(key)} {count}")
+        return lines
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                format_labels(key) or "total": {
+                    "count": count,
+                    "sum": total,
+                    "mean": total / count if count else None,
+                    "buckets": dict(zip([str(bound) for bound in self.buckets] + ["+Inf"], counts)),
+                }
+                for key, (counts, total, count) in self.values.items()
+            }
+
+
+class Timer():
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class MetricsRegistry():
+    """
+    The counters and histograms of one process, exported as Prometheus text on
+    a local HTTP endpoint and as a JSON stats file flushed every few seconds.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def register(self, metric_class, name, *args):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = metric_class(name, *args)
+            return self.metrics[name]
+
+    def prometheus_text(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.prometheus_lines())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in list(self.metrics.items())}
+
+    # written to a temporary file first so readers never see a partial file
+    def write_json(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"updated_at": time.time(), "metrics": self.snapshot()}, f, indent=2)
+        os.replace(temp_path, path)
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name, description):
+    return REGISTRY.register(Counter, name, description)
+
+
+def histogram(name, description, buckets=TIME_BUCKETS):
+    return REGISTRY.register(Histogram, name, description, buckets)
+
+
+def serve_prometheus(port, registry=REGISTRY):
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("localhost", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def flush_json_periodically(path, interval=METRICS_FLUSH_INTERVAL, registry=REGISTRY):
+    def flush():
+        try:
+            registry.write_json(path)
+        except OSError as e:
+            logger.warning("Could not write metrics to %s: %s", path, e)
+
+    def run():
+        while True:
+            time.sleep(interval)
+            flush()
+
+    threading.Thread(target=run, name="metrics-flush", daemon=True).start()
+    # short runs such as scrape_once.py still leave their final numbers behind
+    atexit.register(flush)
+
+
+# exports this process's metrics as data/metrics/<process_name>.json and, when
+# a port is given, on http://localhost:<port>/metrics
+def start_metrics_export(process_name, port=None):
+    flush_json_periodically(os.path.join(METRICS_DIR, f"{process_name}.json"))
+    if port is None:
+        return
+    try:
+        serve_prometheus(port)
+    except OSError as e:
+        logger.warning("Could not serve metrics on port %s: %s", port, e)
@@ -1,5 +1,18 @@
+from config.definitions import IPC_ADDRESS
 from multiprocessing.connection import Client
+from scraper.carousellEventPublisher import load_ipc_authkey
 
-conn = Client(("localhost", 6000), authkey=b"password")
-conn.send("Updated")
-conn.close()
+
+# asks the bot to push the new listings of every monitored search
+def notify_bot(message="Updated"):
+    try:
+        conn = Client(IPC_ADDRESS, authkey=load_ipc_authkey())
+    except ConnectionRefusedError:
+        print("Bot is not listening, skipping update.")
+        return
+    conn.send(message)
+    conn.close()
+
+
+if __name__ == "__main__":
+    notify_bot()
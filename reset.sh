@@ -3,6 +3,7 @@
 read -p "Delete token? (y/n) " answer
 if [ "$answer" == "y" ]; then
     rm ./config/token.txt
+    rm -f ./config/ipc_key
     echo "Token deleted."
 fi
 
@@ -18,10 +19,10 @@ if [ "$answer" == "y" ]; then
     echo "Python virtual environment deleted."
 fi
 
-rm cron_scrape.sh
+rm start_scraper.sh
 rm start_bot.sh
 echo "Cron scripts deleted."
 
-crontab -l | grep -v "cron_scrape.sh" | crontab -
+crontab -l | grep -v "start_scraper.sh" | crontab -
 crontab -l | grep -v "start_bot.sh" | crontab -
 echo "Cron jobs deleted."
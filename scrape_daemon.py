@@ -0,0 +1,52 @@
+from config.definitions import CRAWL_PROFILE_PATH, SCRAPER_METRICS_PORT, SHARD_COORDINATOR_ADDRESS
+from monitoring.metrics import start_metrics_export
+from scraper.carousellCrawlProfile import CarousellCrawlProfile
+from scraper.carousellDaemon import CarousellDaemon
+from scraper.carousellEventPublisher import CarousellEventPublisher
+from scraper.carousellShardCoordinator import CarousellShardCoordinator
+from scraper.carousellShardWorker import run_worker
+import argparse
+import logging
+import multiprocessing
+import signal
+import sys
+
+
+def parse_address(address):
+    host, port = address.rsplit(":", 1)
+    return (host, int(port))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrapes every monitored search as it falls due.")
+    parser.add_argument("--workers", type=int, default=0, help="split the search terms across this many worker processes")
+    parser.add_argument("--join", metavar="NAME", default=None, help="only run one worker, joining a running coordinator")
+    parser.add_argument("--coordinator", default="%s:%s" % SHARD_COORDINATOR_ADDRESS, help="host:port of the shard coordinator")
+    parser.add_argument("--crawl-profile", default=CRAWL_PROFILE_PATH)
+    args = parser.parse_args()
+    coordinator_address = parse_address(args.coordinator)
+
+    if args.join:
+        run_worker(args.join, coordinator_address, args.crawl_profile)
+    elif args.workers:
+        logging.basicConfig(format="%(asctime)s [%(name)s] %(levelname)s: %(message)s", level=logging.INFO)
+        start_metrics_export("scraper", SCRAPER_METRICS_PORT)
+        coordinator = CarousellShardCoordinator(coordinator_address)
+        # each worker starts its own reactor, so none is inherited by fork
+        context = multiprocessing.get_context("spawn")
+        for i in range(args.workers):
+            context.Process(
+                target=run_worker,
+                args=(f"worker-{i}", coordinator.address, args.crawl_profile),
+                daemon=True,
+            ).start()
+        # exit normally on SIGTERM, so the worker processes are stopped too
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        coordinator.start()
+    else:
+        start_metrics_export("scraper", SCRAPER_METRICS_PORT)
+        daemon = CarousellDaemon(
+            event_publisher=CarousellEventPublisher(),
+            crawl_profile=CarousellCrawlProfile.load(args.crawl_profile),
+        )
+        daemon.start()
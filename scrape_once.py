@@ -1,34 +1,26 @@
-from config.definitions import ROOT_DIR
+from monitoring.metrics import start_metrics_export
 from scraper.carousellScraper import CarousellScraper
-import os
-import json
+from scraper.carousellSearchPlanner import plan_searches
+from scraper.carousellSubscriptionStore import CarousellSubscriptionStore
 
 
-def extract_all_search_items(monitored_searches):
-    # search_items is a list of tuples (query, exclude) [note that exclude is a list]
-    search_items = []
-    for user_id in monitored_searches:
-        for search_term in monitored_searches[user_id]["searches"]:
-            search_items.append(
-                (
-                    search_term,
-                    monitored_searches[user_id]["searches"][search_term]["exclude"],
-                )
-            )
-    return search_items
+# search_items is a list of tuples (user_id, query, exclude) [note that exclude is a list]
+def load_search_items(subscription_store=None):
+    if subscription_store is None:
+        subscription_store = CarousellSubscriptionStore()
+    return subscription_store.search_items()
 
 
 if __name__ == "__main__":
-    load_path = os.path.join(ROOT_DIR, "data", "monitored_searches.json")
-    if os.path.exists(load_path):
-        with open(load_path, "r", encoding="utf-8") as f:
-            monitored_searches = json.load(f)
-            print(monitored_searches)
-            all_search_terms = extract_all_search_items(monitored_searches)
+    all_search_terms = load_search_items()
+    print(all_search_terms)
 
-            # TODO: deal with exclude terms
-            # all_search_terms is an array of pairs: (search_term, exclude)
+    if all_search_terms:
+        # all_search_terms is an array of tuples: (user_id, search_term, exclude)
+        # exclude words differ per user, so the bot applies them when matching
 
-            search_terms = [pair[0] for pair in all_search_terms]
-            scraper = CarousellScraper(search_terms=search_terms)
-            scraper.start()
+        # each distinct query is only crawled once
+        search_terms = list(plan_searches(all_search_terms))
+        start_metrics_export("scrape_once")
+        scraper = CarousellScraper(search_terms=search_terms)
+        scraper.start()
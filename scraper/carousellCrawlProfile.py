@@ -0,0 +1,102 @@
+from config.definitions import CAROUSELL_URL, CRAWL_PROFILE_PATH, TWISTED_REACTOR, USER_AGENT
+from scrapy import signals
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CarousellCrawlProfile():
+    """
+    Throughput settings for the crawler, read from config/crawl_profile.json.
+    Keys missing from the file keep the defaults below.
+    """
+
+    DEFAULTS = {
+        # where search pages are fetched from, e.g. a local stand-in server
+        "base_url": CAROUSELL_URL,
+        "concurrent_requests": 16,
+        "concurrent_requests_per_domain": 8,
+        "download_timeout": 30,
+        "retry_times": 2,
+        "dns_cache_enabled": True,
+        "dns_cache_size": 10000,
+        "dns_timeout": 60,
+        # adapt the delay to the server's latency, never exceeding max_requests_per_second
+        "autothrottle": False,
+        "autothrottle_target_concurrency": 4.0,
+        "max_requests_per_second": None,
+    }
+
+    def __init__(self, **options):
+        unknown = set(options) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown crawl profile options: {', '.join(sorted(unknown))}")
+        for name, default in self.DEFAULTS.items():
+            setattr(self, name, options.get(name, default))
+
+    @classmethod
+    def load(cls, path=CRAWL_PROFILE_PATH):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+    def scrapy_settings(self):
+        settings = {
+            "USER_AGENT": USER_AGENT,
+            "TWISTED_REACTOR": TWISTED_REACTOR,
+            "CAROUSELL_BASE_URL": self.base_url,
+            "CONCURRENT_REQUESTS": self.concurrent_requests,
+            "CONCURRENT_REQUESTS_PER_DOMAIN": self.concurrent_requests_per_domain,
+            "DOWNLOAD_TIMEOUT": self.download_timeout,
+            "RETRY_TIMES": self.retry_times,
+            "DNSCACHE_ENABLED": self.dns_cache_enabled,
+            "DNSCACHE_SIZE": self.dns_cache_size,
+            "DNS_TIMEOUT": self.dns_timeout,
+            "AUTOTHROTTLE_ENABLED": self.autothrottle,
+            "AUTOTHROTTLE_TARGET_CONCURRENCY": self.autothrottle_target_concurrency,
+            "EXTENSIONS": {"scraper.carousellCrawlProfile.CrawlThroughputReporter": 500},
+        }
+        if self.max_requests_per_second:
+            # requests to a domain are spaced at least DOWNLOAD_DELAY apart, and
+            # autothrottle never goes below it
+            settings["DOWNLOAD_DELAY"] = 1 / self.max_requests_per_second
+            settings["RANDOMIZE_DOWNLOAD_DELAY"] = False
+            settings["AUTOTHROTTLE_START_DELAY"] = 1 / self.max_requests_per_second
+        return settings
+
+
+class CrawlThroughputReporter():
+    """
+    Scrapy extension logging the throughput achieved by each crawl, also kept in
+    the crawl stats under "throughput/...".
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.started = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        extension = cls(crawler.stats)
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def spider_opened(self, spider):
+        self.started = time.monotonic()
+
+    def spider_closed(self, spider):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        responses = self.stats.get_value("downloader/response_count", 0)
+        failures = self.stats.get_value("downloader/exception_count", 0)
+        retries = self.stats.get_value("retry/count", 0)
+        self.stats.set_value("throughput/elapsed_seconds", elapsed)
+        self.stats.set_value("throughput/responses_per_second", responses / elapsed)
+        logger.info(
+            "Crawl throughput: %d responses in %.2fs (%.2f/s), %d failed downloads, %d retries",
+            responses, elapsed, responses / elapsed, failures, retries,
+        )
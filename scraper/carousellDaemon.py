@@ -0,0 +1,107 @@
+from config.definitions import TWISTED_REACTOR
+from scraper.carousellCrawlProfile import CarousellCrawlProfile
+from scraper.carousellScheduler import CarousellScheduler
+from scraper.carousellSpider import CarousellSpider
+from scraper.carousellSubscriptionStore import CarousellSubscriptionStore
+from monitoring import metrics
+from scrapy import signals
+from scrapy.crawler import CrawlerRunner
+from scrapy.utils.log import configure_logging
+from scrapy.utils.reactor import install_reactor
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# seconds between two checks for due search terms
+TICK_INTERVAL = 1
+
+CRAWL_SECONDS = metrics.histogram("scraper_crawl_seconds", "Duration of one crawl of the due terms")
+
+
+class CarousellDaemon():
+    """
+    Keeps a single reactor running and re-scrapes each monitored search when the
+    scheduler says it is due, instead of starting a new process for every scrape.
+    """
+
+    def __init__(self, subscription_store=None, scheduler=None, event_publisher=None, crawl_profile=None):
+        # subscription_store: polled for added and removed searches
+        # event_publisher: shared by every crawl to send scrape events to the bot
+        self.subscription_store = (
+            subscription_store if subscription_store is not None else CarousellSubscriptionStore()
+        )
+        self.scheduler = scheduler if scheduler is not None else CarousellScheduler()
+        self.crawl_profile = crawl_profile if crawl_profile is not None else CarousellCrawlProfile.load()
+        self.event_publisher = event_publisher
+        self.in_flight = set()
+        # canonical terms with at least one subscriber, in the order they were added
+        self.search_terms = {}
+        self.subscription_version = 0
+        self.runner = None
+
+    # applies only the subscriptions changed since the last reload
+    def reload_search_terms(self):
+        version = self.subscription_store.version()
+        if version == self.subscription_version:
+            return
+        changed_terms = {
+            change["term"] for change in self.subscription_store.changed_since(self.subscription_version)
+        }
+        self.subscription_version = version
+        for term in changed_terms:
+            # each term is scraped once for everyone, exclude words are applied by the bot
+            if self.subscription_store.term_subscriptions(term):
+                self.search_terms.setdefault(term, None)
+            else:
+                self.search_terms.pop(term, None)
+        self.scheduler.set_terms(list(self.search_terms), time.time())
+        logger.info("Monitoring %d search terms", len(self.search_terms))
+
+    def run_cycle(self):
+        try:
+            self.reload_search_terms()
+        except Exception as e:
+            # keep the previous terms if the store is busy
+            logger.warning("Could not reload monitored searches: %s", e)
+
+        # a term is never scraped twice at the same time
+        due_terms = [
+            term for term in self.scheduler.pop_due(time.time()) if term not in self.in_flight
+        ]
+        if not due_terms:
+            return
+
+        self.in_flight.update(due_terms)
+        crawler = self.runner.create_crawler(CarousellSpider)
+        reported = {}
+        crawler.signals.connect(
+            lambda item, **kwargs: reported.__setitem__(item["search_term"], item),
+            signal=signals.item_scraped,
+            weak=False,
+        )
+        deferred = self.runner.crawl(
+            crawler, search_terms=due_terms, event_publisher=self.event_publisher
+        )
+        deferred.addBoth(self.crawl_finished, due_terms, reported, time.time())
+
+    def crawl_finished(self, result, search_terms, reported, started):
+        now = time.time()
+        CRAWL_SECONDS.observe(now - started)
+        self.in_flight.difference_update(search_terms)
+        for term in search_terms:
+            # terms that failed to scrape are retried without changing their rate
+            item = reported.get(term, {})
+            self.scheduler.record(term, item.get("new_listings"), now, item.get("requests"))
+        return result
+
+    def start(self):
+        install_reactor(TWISTED_REACTOR)
+        configure_logging()
+
+        from twisted.internet import reactor, task
+
+        self.runner = CrawlerRunner(settings=self.crawl_profile.scrapy_settings())
+        loop = task.LoopingCall(self.run_cycle)
+        loop.start(TICK_INTERVAL, now=True)
+        reactor.run()
@@ -0,0 +1,79 @@
+from config.definitions import IPC_ADDRESS, IPC_KEY_DIR
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+import logging
+import os
+import secrets
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# shared secret for the scraper -> bot connection, created on first use
+def load_ipc_authkey():
+    try:
+        fd = os.open(IPC_KEY_DIR, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(IPC_KEY_DIR, "r") as f:
+            return bytes.fromhex(f.read().strip())
+    key = secrets.token_bytes(32)
+    with os.fdopen(fd, "w") as f:
+        f.write(key.hex())
+    return key
+
+
+# price_drops and bumps: listings of the term that changed since they were last seen
+def scrape_event(search_term, scrape_id, scraped_at, new_listings, price_drops=(), bumps=()):
+    return {
+        "type": "scrape",
+        "term": search_term,
+        "scrape_id": scrape_id,
+        "scraped_at": scraped_at,
+        "new_listings": new_listings,
+        "price_drops": list(price_drops),
+        "bumps": list(bumps),
+    }
+
+
+class CarousellEventPublisher():
+    """
+    Sends scrape events to the bot over one persistent connection, reconnecting
+    when the bot restarts. Events are dropped while the bot is not listening.
+    """
+
+    def __init__(self, address=IPC_ADDRESS):
+        self.address = address
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def publish(self, event):
+        with self.lock:
+            # one retry covers a connection closed by a bot restart
+            for _ in range(2):
+                try:
+                    if self.conn is None:
+                        self.conn = Client(self.address, authkey=load_ipc_authkey())
+                    self.conn.send(event)
+                    return True
+                except ConnectionRefusedError:
+                    logger.warning("Bot is not listening, dropping %s event", event["type"])
+                    return False
+                except AuthenticationError:
+                    logger.error("Bot rejected the IPC key in %s", IPC_KEY_DIR)
+                    self.close_connection()
+                    return False
+                except (OSError, EOFError):
+                    self.close_connection()
+            return False
+
+    def close_connection(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except OSError:
+                pass
+            self.conn = None
+
+    def close(self):
+        with self.lock:
+            self.close_connection()
@@ -0,0 +1,67 @@
+from array import array
+import hashlib
+import re
+
+LISTING_ID_BYTES_PATTERN = re.compile(rb'data-testid="listing-card-(\d{10})')
+PRICE_BYTES_PATTERN = re.compile(rb"S\$[\d,]+(?:\.\d+)?|FREE")
+
+
+class PageFingerprint():
+    """
+    Cheap summary of a search result page, used to skip parsing pages that have
+    not changed since the last scrape.
+    """
+
+    def __init__(self, body_hash, listing_ids, price_hash=None, etag=None, last_modified=None):
+        self.body_hash = body_hash
+        self.listing_ids = listing_ids
+        self.price_hash = price_hash
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @classmethod
+    def from_response(cls, response):
+        return cls(
+            hashlib.blake2b(response.body, digest_size=16).digest(),
+            prescan_listing_ids(response.body),
+            prescan_price_hash(response.body),
+            header(response, b"ETag"),
+            header(response, b"Last-Modified"),
+        )
+
+    # same bytes, or at least the same listings in the same order at the same prices
+    def matches(self, other):
+        if other is None:
+            return False
+        if self.body_hash == other.body_hash:
+            return True
+        return (
+            self.listing_ids == other.listing_ids
+            and self.price_hash is not None
+            and self.price_hash == other.price_hash
+        )
+
+    def listing_ids_blob(self):
+        return array("Q", self.listing_ids).tobytes()
+
+    @staticmethod
+    def listing_ids_from_blob(blob):
+        listing_ids = array("Q")
+        listing_ids.frombytes(blob)
+        return list(listing_ids)
+
+
+# ordered listing IDs on the page, without building a DOM
+def prescan_listing_ids(body):
+    return [int(listing_id) for listing_id in LISTING_ID_BYTES_PATTERN.findall(body)]
+
+
+# digest of the prices shown on the page, in order, so a price change alone
+# still counts as a change
+def prescan_price_hash(body):
+    return hashlib.blake2b(b"|".join(PRICE_BYTES_PATTERN.findall(body)), digest_size=16).digest()
+
+
+def header(response, name):
+    value = response.headers.get(name)
+    return value.decode("latin-1") if value is not None else None
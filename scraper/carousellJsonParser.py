@@ -0,0 +1,92 @@
+from scraper.carousellListing import make_listing
+import json
+
+# the state blob server-rendered search pages hand to the front end
+STATE_MARKER = b"window.initialState"
+LISTINGS_KEY = b'"listingCards":'
+SCRIPT_END = b"</script>"
+
+decoder = json.JSONDecoder()
+
+
+class CarousellJsonParser():
+    """
+    Reads the listings from the JSON state blob embedded in server-rendered
+    search pages instead of from the card markup.
+
+    The blob and its listing array are found with byte searches on the raw
+    body, and only the listing array is decoded. The rest of the page, and of
+    the blob, is never parsed. parse() returns None when the page has no
+    readable blob, so the caller can fall back to a DOM parser, and leaves the
+    reason in `failure`.
+
+    The blob's keys have only been checked against the synthetic pages in
+    benchmarks/fixtures, so a card without a title, price or age is treated as
+    unreadable rather than stored with the field missing.
+    """
+
+    def __init__(self, body, scraped_at):
+        self.body = body
+        self.scraped_at = scraped_at
+        # why parse() returned None: "no_blob", "bad_json" or "bad_card"
+        self.failure = None
+
+    # the listing array as a str, None when the page has none
+    def find_listing_array(self):
+        # the blob comes after the markup, so search from the end
+        state_start = self.body.rfind(STATE_MARKER)
+        if state_start == -1:
+            return None
+        state_end = self.body.find(SCRIPT_END, state_start)
+        if state_end == -1:
+            return None
+        key = self.body.find(LISTINGS_KEY, state_start, state_end)
+        if key == -1:
+            return None
+        # a "</script>" inside JSON strings is always escaped, so the array ends before it
+        return self.body[key + len(LISTINGS_KEY):state_end].decode("utf-8", "replace").lstrip()
+
+    # returns a list of listing records (unsorted), or None without a readable blob
+    def parse(self):
+        listing_array = self.find_listing_array()
+        if listing_array is None:
+            self.failure = "no_blob"
+            return None
+        try:
+            cards, _ = decoder.raw_decode(listing_array)
+        except ValueError:
+            cards = None
+        if not isinstance(cards, list):
+            self.failure = "bad_json"
+            return None
+        item_list = []
+        for card in cards:
+            item = listing_from_card(card, self.scraped_at)
+            if item is None:
+                # one unreadable card means the blob's layout changed, trust the DOM instead
+                self.failure = "bad_card"
+                return None
+            item_list.append(item)
+        return item_list
+
+
+# None when a field every card shows (title, price, age) cannot be read
+def listing_from_card(card, scraped_at):
+    try:
+        seller = card.get("seller") or {}
+        item = make_listing(
+            listing_id=card["id"],
+            listing_url=card.get("listingUrl"),
+            title=card.get("title"),
+            price=card.get("price"),
+            stricken_price=card.get("originalPrice"),
+            seller_url=seller.get("profileUrl"),
+            age=card.get("timeAgo"),
+            is_bumped=card.get("isBumped", False),
+            scraped_at=scraped_at,
+        )
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+    if item["title"] is None or item["price_cents"] is None or item["posted_at"] is None:
+        return None
+    return item
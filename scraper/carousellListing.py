@@ -0,0 +1,126 @@
+from decimal import Decimal, InvalidOperation
+import time
+
+"""
+Every parser emits listings as dicts with exactly these fields and types:
+{
+  "listing_id": int,
+  "listing_url": str | None,
+  "title": str | None,
+  "price_cents": int | None,           # S$12.50 -> 1250, FREE -> 0
+  "stricken_price_cents": int | None,  # the crossed-out original price, if any
+  "seller_url": str | None,
+  "posted_at": int | None,             # epoch seconds, from the card's age at scrape time
+  "is_bumped": bool,
+}
+plus "posted_at_resolution": int | None, the seconds in one unit of the age
+string ("3 hours" -> 3600), which is how far posted_at can be off. It is only
+used to tell bumps apart from that rounding and is not stored.
+"""
+LISTING_SCHEMA = {
+    "listing_id": (int, "INTEGER NOT NULL"),
+    "listing_url": (str, "TEXT"),
+    "title": (str, "TEXT"),
+    "price_cents": (int, "INTEGER"),
+    "stricken_price_cents": (int, "INTEGER"),
+    "seller_url": (str, "TEXT"),
+    "posted_at": (int, "INTEGER"),
+    "is_bumped": (bool, "INTEGER NOT NULL"),
+}
+LISTING_FIELDS = tuple(LISTING_SCHEMA)
+
+# seconds per unit of the "5 minutes ago" strings on listing cards
+AGE_UNITS = (
+    ("second", 1),
+    ("min", 60),
+    ("hour", 60 * 60),
+    ("day", 24 * 60 * 60),
+    ("week", 7 * 24 * 60 * 60),
+    ("month", 30 * 24 * 60 * 60),
+    ("year", 12 * 30 * 24 * 60 * 60),
+)
+
+
+def make_listing(listing_id, listing_url, title, price, stricken_price, seller_url, age, is_bumped, scraped_at):
+    """
+    Builds the typed listing record from the strings found on a card.
+    """
+    return {
+        "listing_id": int(listing_id),
+        "listing_url": listing_url,
+        "title": title,
+        "price_cents": price_string_to_cents(price),
+        "stricken_price_cents": price_string_to_cents(stricken_price),
+        "seller_url": seller_url,
+        "posted_at": posted_at(age, scraped_at),
+        "is_bumped": bool(is_bumped),
+        "posted_at_resolution": age_to_seconds(age)[1],
+    }
+
+
+# "S$1,234.50" -> 123450, "FREE" -> 0, None for anything else
+def price_string_to_cents(price):
+    if price is None:
+        return None
+    try:
+        dollars = Decimal(price.replace("FREE", "0").replace("S$", "").replace(",", "").strip())
+    except InvalidOperation:
+        return None
+    if not dollars.is_finite():
+        return None
+    return int((dollars * 100).to_integral_value())
+
+
+# "5 minutes" -> (300, 60): the age and the seconds in its unit, (None, None)
+# when the string cannot be read
+def age_to_seconds(age):
+    if age is None:
+        return None, None
+    parts = age.replace(" ago", "").split()
+    if len(parts) != 2:
+        return (0, 60) if age.strip() == "just now" else (None, None)
+    number, unit = parts
+    if number in ("a", "an"):
+        number = "1"
+    if not number.isdigit():
+        return None, None
+    for prefix, seconds in AGE_UNITS:
+        if unit.startswith(prefix):
+            return int(number) * seconds, seconds
+    return None, None
+
+
+# absolute posting time (epoch seconds) of a card showing `age` at `scraped_at`
+def posted_at(age, scraped_at):
+    seconds, _ = age_to_seconds(age)
+    if seconds is None:
+        return None
+    return int(scraped_at) - seconds
+
+
+# sort key putting the most recently posted listings first, undated ones last
+def recency_key(listing):
+    if listing["posted_at"] is None:
+        return float("inf")
+    return -listing["posted_at"]
+
+
+# 1250 -> "12.50", 4000 -> "40"
+def format_price(cents):
+    if cents is None:
+        return "?"
+    dollars, remainder = divmod(cents, 100)
+    return f"{dollars:,}" if remainder == 0 else f"{dollars:,}.{remainder:02d}"
+
+
+# the "5 minutes" shown next to a listing, from its posting time
+def format_age(listing_posted_at, now=None):
+    if listing_posted_at is None:
+        return None
+    elapsed = max(int((time.time() if now is None else now) - listing_posted_at), 0)
+    name, seconds = "second", 1
+    for prefix, unit_seconds in AGE_UNITS:
+        if elapsed >= unit_seconds:
+            name, seconds = {"min": "minute"}.get(prefix, prefix), unit_seconds
+    number = elapsed // seconds
+    return f"{number} {name}" + ("" if number == 1 else "s")
@@ -0,0 +1,143 @@
+from config.definitions import DATA_DIR, LISTING_STATE_RETENTION
+from scraper.carousellSearchPlanner import term_file_name
+import numpy as np
+import os
+
+STATE_DIR = os.path.join(DATA_DIR, "state")
+
+# 34 bytes per listing, no padding
+STATE_DTYPE = np.dtype([
+    ("listing_id", "<u8"),
+    ("price_cents", "<i8"),
+    ("first_seen", "<u4"),
+    ("last_seen", "<u4"),
+    ("posted_at", "<u4"),
+    # seconds in one unit of the age string posted_at was worked out from
+    ("posted_resolution", "<u4"),
+    ("bump_count", "<u2"),
+])
+# stands in for a missing price or posting time
+NO_PRICE = -1
+NO_TIME = 0
+
+# a bump resets the listing's age, so its posting time moves forward by more
+# than the unit of its age string: a card showing "3 hours" for an hour has its
+# posting time creep forward by up to an hour without being bumped
+BUMP_MIN_ADVANCE = 60
+
+
+class CarousellListingState():
+    """
+    Compact per-listing state for one search, kept in data/state/<term>.npy as a
+    structured array sorted by listing ID: last price, first and last seen
+    times, posting time (and its resolution) and how often the listing has
+    been bumped.
+
+    update() compares a scrape against it and reports the listings whose price
+    dropped or that were bumped since they were last seen.
+    """
+
+    def __init__(self, search_term, retention=LISTING_STATE_RETENTION):
+        self.path = os.path.join(STATE_DIR, f"{term_file_name(search_term)}.npy")
+        self.retention = retention
+        self.records = np.zeros(0, dtype=STATE_DTYPE)
+        if os.path.exists(self.path):
+            self.records = np.load(self.path, allow_pickle=False)
+
+    def __len__(self):
+        return len(self.records)
+
+    def update(self, item_list, scraped_at):
+        """
+        Records the scrape and returns (price_drops, bumps): copies of the
+        listings whose price fell, with "previous_price_cents", and of the
+        listings bumped again, with their "bump_count".
+        """
+        if not item_list:
+            return [], []
+        # a listing can appear twice in one scrape
+        items = list({item["listing_id"]: item for item in item_list}.values())
+        ids = np.array([item["listing_id"] for item in items], dtype=np.uint64)
+        prices = np.array(
+            [NO_PRICE if item["price_cents"] is None else item["price_cents"] for item in items],
+            dtype=np.int64,
+        )
+        posted = np.array(
+            [NO_TIME if item["posted_at"] is None else item["posted_at"] for item in items],
+            dtype=np.int64,
+        )
+        resolution = np.array(
+            [item.get("posted_at_resolution") or BUMP_MIN_ADVANCE for item in items], dtype=np.int64
+        )
+        bumped_now = np.array([item["is_bumped"] for item in items], dtype=bool)
+        now = int(scraped_at)
+
+        index = np.searchsorted(self.records["listing_id"], ids)
+        known = index < len(self.records)
+        known[known] = self.records["listing_id"][index[known]] == ids[known]
+        rows = index[known]
+        previous = self.records[rows]
+
+        # only listings already tracked can have changed
+        dropped = (prices[known] != NO_PRICE) & (previous["price_cents"] != NO_PRICE) & (
+            prices[known] < previous["price_cents"]
+        )
+        # the posting time worked out from either scrape's age string can be off by its unit
+        min_advance = np.maximum(
+            np.maximum(resolution[known], previous["posted_resolution"].astype(np.int64)), BUMP_MIN_ADVANCE
+        )
+        bumped = (
+            bumped_now[known]
+            & (posted[known] != NO_TIME)
+            & (previous["posted_at"] != NO_TIME)
+            & (posted[known] > previous["posted_at"].astype(np.int64) + min_advance)
+        )
+
+        updated = previous.copy()
+        has_price = prices[known] != NO_PRICE
+        updated["price_cents"][has_price] = prices[known][has_price]
+        updated["last_seen"] = now
+        has_posted = posted[known] != NO_TIME
+        updated["posted_at"][has_posted] = posted[known][has_posted]
+        updated["posted_resolution"][has_posted] = resolution[known][has_posted]
+        updated["bump_count"][bumped] += 1
+        self.records[rows] = updated
+
+        new_records = np.zeros(np.count_nonzero(~known), dtype=STATE_DTYPE)
+        new_records["listing_id"] = ids[~known]
+        new_records["price_cents"] = prices[~known]
+        new_records["first_seen"] = now
+        new_records["last_seen"] = now
+        new_records["posted_at"] = posted[~known]
+        new_records["posted_resolution"] = resolution[~known]
+        self.merge(new_records)
+
+        known_items = [item for item, is_known in zip(items, known) if is_known]
+        price_drops = [
+            dict(item, previous_price_cents=int(price))
+            for item, price, is_drop in zip(known_items, previous["price_cents"], dropped)
+            if is_drop
+        ]
+        bumps = [
+            dict(item, bump_count=int(count))
+            for item, count, is_bump in zip(known_items, updated["bump_count"], bumped)
+            if is_bump
+        ]
+        return price_drops, bumps
+
+    # adds new records, keeping the array sorted and within the retention limit
+    def merge(self, new_records):
+        if len(new_records):
+            records = np.concatenate([self.records, new_records])
+            self.records = records[np.argsort(records["listing_id"], kind="stable")]
+        if len(self.records) > self.retention:
+            # forget the listings that have gone longest without being seen
+            keep = np.argsort(self.records["last_seen"], kind="stable")[-self.retention:]
+            self.records = self.records[np.sort(keep)]
+
+    def save(self):
+        os.makedirs(STATE_DIR, exist_ok=True)
+        tmp_path = self.path + ".tmp.npy"
+        np.save(tmp_path, self.records, allow_pickle=False)
+        os.replace(tmp_path, self.path)
+
@@ -0,0 +1,218 @@
+from config.definitions import LISTING_DB_PATH
+from scraper.carousellFingerprint import PageFingerprint
+from scraper.carousellListing import LISTING_FIELDS, LISTING_SCHEMA
+from scraper.carousellSearchPlanner import canonicalize_term
+import os
+import sqlite3
+import threading
+import time
+
+LISTING_COLUMNS = LISTING_FIELDS + ("is_new",)
+LISTING_TYPES = {**{field: python_type for field, (python_type, _) in LISTING_SCHEMA.items()}, "is_new": bool}
+
+SCRAPES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scrapes (
+    scrape_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    term TEXT NOT NULL,
+    scraped_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scrapes_term ON scrapes (term, scrape_id);
+"""
+
+LISTING_COLUMN_DDL = ",\n    ".join(f"{field} {sql_type}" for field, (_, sql_type) in LISTING_SCHEMA.items())
+
+# the latest copy of each listing, shared by every term it shows up under
+LISTINGS_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS listings (
+    {LISTING_COLUMN_DDL},
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (listing_id)
+);
+"""
+
+# each scrape only keeps the IDs of its listings, in result order
+SCRAPE_LISTINGS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scrape_listings (
+    scrape_id INTEGER NOT NULL REFERENCES scrapes (scrape_id),
+    rank INTEGER NOT NULL,
+    listing_id INTEGER NOT NULL,
+    is_new INTEGER NOT NULL,
+    PRIMARY KEY (scrape_id, rank)
+) WITHOUT ROWID;
+"""
+
+FINGERPRINTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS page_fingerprints (
+    term TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    body_hash BLOB NOT NULL,
+    listing_ids BLOB NOT NULL,
+    price_hash BLOB,
+    etag TEXT,
+    last_modified TEXT,
+    PRIMARY KEY (term, page)
+);
+"""
+
+LISTING_UPSERT = f"""
+INSERT INTO listings VALUES ({", ".join("?" * (len(LISTING_FIELDS) + 1))})
+ON CONFLICT (listing_id) DO UPDATE SET
+    {", ".join(f"{field} = excluded.{field}" for field in LISTING_FIELDS[1:])},
+    updated_at = excluded.updated_at
+WHERE excluded.updated_at >= listings.updated_at
+    AND ({", ".join(LISTING_FIELDS[1:])}) IS NOT ({", ".join(f"excluded.{field}" for field in LISTING_FIELDS[1:])})
+"""
+
+SCHEMA = SCRAPES_SCHEMA + LISTINGS_SCHEMA + SCRAPE_LISTINGS_SCHEMA + FINGERPRINTS_SCHEMA
+SCHEMA_VERSION = 1
+
+# script bringing a database at each version to the next one, none so far
+MIGRATIONS = {}
+
+
+class CarousellListingStore():
+    """
+    SQLite store holding every scrape of every search term.
+
+    A listing is stored once, under its ID, however many terms it shows up
+    under; scrapes only keep the IDs of their listings, in result order, and
+    whether each one was new to the term. A listing's row is overwritten with
+    the latest scrape that saw it.
+
+    The database runs in WAL mode, so the bot can query it while the scraper is
+    writing. Each thread gets its own connection.
+    """
+
+    def __init__(self, db_path=LISTING_DB_PATH):
+        self.db_path = db_path
+        self.local = threading.local()
+        self.migrate()
+
+    def migrate(self):
+        conn = self.connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        # a new database reports version 0 and gets the current schema directly
+        steps = range(version, SCHEMA_VERSION) if version else ()
+        # executescript commits first, so run the whole migration as one script
+        script = "".join(MIGRATIONS[step] for step in steps) + SCHEMA
+        conn.executescript(f"BEGIN; {script} PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;")
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    # appends one scrape of a term, returns its scrape_id
+    def add_scrape(self, search_term, item_list, scraped_at=None):
+        term = canonicalize_term(search_term)
+        scraped_at = time.time() if scraped_at is None else scraped_at
+        listings = [(*[item.get(field) for field in LISTING_FIELDS], scraped_at) for item in item_list]
+
+        with self.connection() as conn:
+            scrape_id = conn.execute(
+                "INSERT INTO scrapes (term, scraped_at) VALUES (?, ?)", (term, scraped_at)
+            ).lastrowid
+            # an older scrape finishing late, or an unchanged listing, leaves the row alone
+            conn.executemany(LISTING_UPSERT, listings)
+            conn.executemany(
+                "INSERT INTO scrape_listings VALUES (?, ?, ?, ?)",
+                [
+                    (scrape_id, rank, item["listing_id"], item.get("is_new"))
+                    for rank, item in enumerate(item_list)
+                ],
+            )
+        return scrape_id
+
+    def latest_scrape_id(self, search_term):
+        row = self.connection().execute(
+            "SELECT MAX(scrape_id) FROM scrapes WHERE term = ?",
+            (canonicalize_term(search_term),),
+        ).fetchone()
+        return row[0]
+
+    # listings of the latest scrape matching the given condition
+    # Only rank order comes from an index. Other orders sort the one scrape's
+    # rows (a few pages of cards), since an index on a copy of the price in
+    # scrape_listings would go stale as other terms update the shared row.
+    def query_latest(self, search_term, where="1", order_by="rank", limit=-1, params=()):
+        rows = self.connection().execute(
+            f"""SELECT listings.*, scrape_listings.is_new
+            FROM scrape_listings JOIN listings USING (listing_id)
+            WHERE scrape_id = (SELECT MAX(scrape_id) FROM scrapes WHERE term = ?) AND {where}
+            ORDER BY {order_by} LIMIT ?""",
+            (canonicalize_term(search_term), *params, limit),
+        )
+        return [listing_from_row(row) for row in rows]
+
+    def recent(self, search_term, num):
+        return self.query_latest(search_term, limit=num)
+
+    def cheapest(self, search_term, num):
+        return self.query_latest(
+            search_term, where="price_cents IS NOT NULL", order_by="price_cents", limit=num
+        )
+
+    # bounds in whole dollars, as typed by users
+    def price_range(self, search_term, min_price, max_price):
+        return self.query_latest(
+            search_term,
+            where="price_cents BETWEEN ? AND ?",
+            params=(min_price * 100, max_price * 100),
+        )
+
+    def new_listings(self, search_term):
+        return self.query_latest(search_term, where="is_new")
+
+    # the latest stored copy of the given listings, in the given order, from
+    # whichever scrape last saw each one
+    def latest_listings(self, listing_ids):
+        rows = self.connection().execute(
+            f"""SELECT *, 0 AS is_new FROM listings
+            WHERE listing_id IN ({', '.join('?' * len(listing_ids))})""",
+            tuple(listing_ids),
+        )
+        listings = {row["listing_id"]: listing_from_row(row) for row in rows}
+        return [listings[listing_id] for listing_id in listing_ids if listing_id in listings]
+
+    def fingerprint(self, search_term, page):
+        row = self.connection().execute(
+            "SELECT * FROM page_fingerprints WHERE term = ? AND page = ?",
+            (canonicalize_term(search_term), page),
+        ).fetchone()
+        if row is None:
+            return None
+        return PageFingerprint(
+            row["body_hash"],
+            PageFingerprint.listing_ids_from_blob(row["listing_ids"]),
+            row["price_hash"],
+            row["etag"],
+            row["last_modified"],
+        )
+
+    def save_fingerprints(self, search_term, fingerprints):
+        term = canonicalize_term(search_term)
+        with self.connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO page_fingerprints VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (term, page, f.body_hash, f.listing_ids_blob(), f.price_hash, f.etag, f.last_modified)
+                    for page, f in fingerprints.items()
+                ],
+            )
+
+
+# the stored row as a listing record, with the column types restored
+def listing_from_row(row):
+    listing = {}
+    for column in LISTING_COLUMNS:
+        value = row[column]
+        listing[column] = value if value is None else LISTING_TYPES[column](value)
+    return listing
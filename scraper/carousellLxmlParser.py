@@ -0,0 +1,122 @@
+from lxml import etree, html
+from scraper.carousellListing import make_listing
+import re
+
+# compiled once per process and shared by every card
+LISTING_CARD_XPATH = etree.XPath(
+    r"//main//*[re:test(@data-testid, 'listing-card-\d{10}')]",
+    namespaces={"re": "http://exslt.org/regular-expressions"},
+)
+LISTING_ID_PATTERN = re.compile(r"listing-card-(\d{10})")
+LISTING_HREF_PATTERN = re.compile("/p/")
+SELLER_HREF_PATTERN = re.compile("/u/")
+SELLER_NAME_TESTID = "listing-card-text-seller-name"
+
+
+class CarousellLxmlParser():
+    """
+    Same output as the BeautifulSoup parser, but works on the lxml tree directly.
+    """
+
+    def __init__(self, text, scraped_at):
+        self.root = html.document_fromstring(text)
+        self.scraped_at = scraped_at
+
+    # returns a list of listing records (unsorted)
+    def parse(self):
+        return [
+            CarousellLxmlItemParser(card).parse(self.scraped_at) for card in LISTING_CARD_XPATH(self.root)
+        ]
+
+
+class CarousellLxmlItemParser:
+
+    def __init__(self, card):
+        self.card = card
+        self.listing_anchor = None
+        self.seller_anchor = None
+        self.seller_name = None
+        self.find_anchors()
+
+    # walk the card once, keeping the first node of each kind
+    def find_anchors(self):
+        for node in self.card.iterdescendants(tag=etree.Element):
+            href = node.get("href")
+            if href is not None:
+                if self.listing_anchor is None and LISTING_HREF_PATTERN.search(href):
+                    self.listing_anchor = node
+                elif self.seller_anchor is None and SELLER_HREF_PATTERN.search(href):
+                    self.seller_anchor = node
+            if self.seller_name is None and node.get("data-testid") == SELLER_NAME_TESTID:
+                self.seller_name = node
+            if (
+                self.listing_anchor is not None
+                and self.seller_anchor is not None
+                and self.seller_name is not None
+            ):
+                return
+
+    def parse(self, scraped_at):
+        title_node, price_node = self.get_listing_nodes()
+        seller_sibling = self.seller_name.getnext() if self.seller_name is not None else None
+
+        return make_listing(
+            listing_id=self.get_listing_id(),
+            listing_url=self.get_listing_url(),
+            title=title_node.text_content() if title_node is not None else None,
+            price=self.get_price(price_node),
+            stricken_price=self.get_stricken_price(price_node),
+            seller_url=self.get_seller_url(),
+            age=self.get_age(seller_sibling),
+            is_bumped=self.is_bumped(seller_sibling),
+            scraped_at=scraped_at,
+        )
+
+    # the listing anchor holds [image, title, price block, ...]
+    def get_listing_nodes(self):
+        if self.listing_anchor is None:
+            return None, None
+        children = list(self.listing_anchor)
+        title_node = children[1] if len(children) > 1 else None
+        price_node = children[2] if len(children) > 2 else None
+        return title_node, price_node
+
+    def get_listing_id(self):
+        return int(LISTING_ID_PATTERN.search(self.card.get("data-testid")).group(1))
+
+    def get_listing_url(self):
+        if self.listing_anchor is None:
+            return None
+        return self.listing_anchor.get("href")
+
+    def get_price(self, price_node):
+        if price_node is None:
+            return None
+        price = price_node.find(".//p")
+        if price is None:
+            return None
+        return price.text_content()
+
+    def get_stricken_price(self, price_node):
+        # if the element does not exist, stricken_price should be None
+        if price_node is None:
+            return None
+        stricken_price = price_node.find(".//s")
+        if stricken_price is None:
+            return None
+        return stricken_price.text_content()
+
+    def get_seller_url(self):
+        if self.seller_anchor is None:
+            return None
+        return self.seller_anchor.get("href")
+
+    def get_age(self, seller_sibling):
+        if seller_sibling is None:
+            return None
+        return seller_sibling.text_content().replace(" ago", "")
+
+    def is_bumped(self, seller_sibling):
+        if seller_sibling is None:
+            return False
+        return seller_sibling.find(".//svg") is not None
@@ -1,64 +1,86 @@
 from bs4 import BeautifulSoup
+from config.definitions import PARSER_ENGINE
+from monitoring import metrics
+from scraper.carousellJsonParser import CarousellJsonParser
+from scraper.carousellListing import make_listing, recency_key
+from scraper.carousellLxmlParser import CarousellLxmlParser, LISTING_ID_PATTERN
+import logging
 import re
+import time
 
-class CarousellResponseParser():
+logger = logging.getLogger(__name__)
+
+PARSER_ENGINES = ("json", "lxml", "bs4")
+
+JSON_FALLBACKS = metrics.counter(
+    "scraper_json_fallbacks_total", "Pages without a readable state blob, parsed from the DOM instead, by reason"
+)
 
-    def __init__(self, response):
-        self.soup = BeautifulSoup(response.text, "lxml")
+class CarousellResponseParser():
 
-    # returns a list of item_attribute dicts
+    # engine: "json" (embedded state blob, falling back to lxml), "lxml" (single-pass
+    # extraction) or "bs4" (original BeautifulSoup parser)
+    # scraped_at: epoch seconds the card ages are relative to, defaults to now
+    def __init__(self, response, engine=PARSER_ENGINE, scraped_at=None):
+        if engine not in PARSER_ENGINES:
+            raise ValueError(f"Unknown parser engine: {engine}")
+        self.response = response
+        self.engine = engine
+        self.scraped_at = time.time() if scraped_at is None else scraped_at
+
+    # returns a list of listing records (see scraper/carousellListing.py), newest first
     def parse(self):
-        all_items = self.soup.main.find_all(
-            attrs={"data-testid": re.compile("listing-card-\d{10}")}
+        if self.engine == "json":
+            item_list = self.parse_json()
+        elif self.engine == "lxml":
+            item_list = CarousellLxmlParser(self.response.text, self.scraped_at).parse()
+        else:
+            item_list = self.parse_soup()
+
+        return sorted(item_list, key=recency_key)
+
+    # falls back to the lxml parser when the page has no readable state blob
+    def parse_json(self):
+        json_parser = CarousellJsonParser(self.response.body, self.scraped_at)
+        item_list = json_parser.parse()
+        if item_list is None:
+            JSON_FALLBACKS.inc(reason=json_parser.failure)
+            logger.info("Parsing %s from its markup, state blob: %s", self.response.url, json_parser.failure)
+            item_list = CarousellLxmlParser(self.response.text, self.scraped_at).parse()
+        return item_list
+
+    def parse_soup(self):
+        soup = BeautifulSoup(self.response.text, "lxml")
+        all_items = soup.main.find_all(
+            attrs={"data-testid": LISTING_ID_PATTERN}
         )
         item_list = []
         for item in all_items:
-            item_attributes = CarousellItemParser(item).parse()
+            item_attributes = CarousellItemParser(item).parse(self.scraped_at)
             if item_attributes is not None:
                 item_list.append(item_attributes)
-        
-        # sort by age
-        return sorted(item_list,
-                      key=CarousellResponseParser.age_key_function)
-
-    def age_key_function(item_attribute):
-        return CarousellResponseParser.age_str_to_hours(item_attribute['age'])
-
-    # convert age string to hours (for sorting)
-    def age_str_to_hours(age_str):
-        split_age = age_str.split(" ")
-        number = int(split_age[0])
-        if "min" in split_age[1]:
-            return number / 60
-        elif "hour" in split_age[1]:
-            return number
-        elif "day" in split_age[1]:
-            return number * 24
-        elif "month" in split_age[1]:
-            return number * 24 * 30
-        elif "year" in split_age[1]:
-            return number * 24 * 30 * 12
-        else:
-            return 0
+        return item_list
 
 class CarousellItemParser:
 
-    # TODO: implement excluded words
     def __init__(self, item):
         self.item = item
     
-    def parse(self):
-        item_attributes = {
-            "listing_url": self.get_listing_url(),
-            "title": self.get_title(),
-            "price": self.get_price(),
-            "stricken_price": self.get_stricken_price(),
-            "seller_url": self.get_seller_url(),
-            "age": self.get_age(),
-            "is_bumped": self.is_bumped(),
-        }
-
-        return item_attributes
+    def parse(self, scraped_at):
+        return make_listing(
+            listing_id=self.get_listing_id(),
+            listing_url=self.get_listing_url(),
+            title=self.get_title(),
+            price=self.get_price(),
+            stricken_price=self.get_stricken_price(),
+            seller_url=self.get_seller_url(),
+            age=self.get_age(),
+            is_bumped=self.is_bumped(),
+            scraped_at=scraped_at,
+        )
+
+    def get_listing_id(self):
+        return int(LISTING_ID_PATTERN.search(self.item["data-testid"]).group(1))
 
     def get_listing_url(self):
         try:
@@ -81,7 +103,7 @@ class CarousellItemParser:
             price = self.item.find(
                 href=re.compile("/p/")
             ).next_element.next_sibling.next_sibling.find('p').text  
-            return CarousellItemParser.price_string_to_float(price)
+            return price
         except:
             return None
 
@@ -93,15 +115,10 @@ class CarousellItemParser:
             ).next_element.next_sibling.next_sibling.find('s')
             if stricken_price_element is None:
                 return None
-            return CarousellItemParser.price_string_to_float(stricken_price_element.text)
+            return stricken_price_element.text
         except:
             return None
 
-    def price_string_to_float(price):
-        return float(price.replace('FREE', '0') \
-                          .replace('S$', "") \
-                          .replace(",", ""))
-
     def get_seller_url(self):
         try:
             return self.item.find(href=re.compile("/u/")).get("href")
@@ -127,4 +144,4 @@ class CarousellItemParser:
                 != None
             )
         except:
-            return None
+            return False
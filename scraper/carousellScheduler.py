@@ -0,0 +1,169 @@
+from config.definitions import (
+    MAX_SCRAPE_INTERVAL,
+    MAX_SEARCH_PAGES,
+    MIN_SCRAPE_INTERVAL,
+    PRIOR_SCRAPE_INTERVAL,
+    SCRAPE_BUDGET,
+)
+import heapq
+
+
+class CarousellScheduler():
+    """
+    Decides when each search term is scraped next.
+
+    Every term keeps a smoothed rate of new listings per second. A term is
+    re-scraped after roughly the time it takes `target_new_listings` to
+    arrive, within [min_interval, max_interval]. If all terms together would
+    need more than `requests_per_minute`, every interval is stretched by the
+    same factor. Each scrape counts for the pages it fetches, smoothed per
+    term, and for max_pages until the term has been scraped.
+
+    A term's rate starts from the one `prior_interval` implies, and its
+    interval at most doubles from one scrape to the next, so a quiet spell
+    backs off gradually towards max_interval instead of jumping there.
+
+    The budget is also enforced on the requests actually sent: a token bucket
+    holding `burst_seconds` of budget is charged a term's expected pages when
+    it is handed out and settled with the pages it fetched, and due terms wait
+    for tokens. New terms get staggered first scrapes, so a restart or a batch
+    of new subscriptions does not fire every term at once.
+    """
+
+    def __init__(
+        self,
+        min_interval=MIN_SCRAPE_INTERVAL,
+        max_interval=MAX_SCRAPE_INTERVAL,
+        requests_per_minute=SCRAPE_BUDGET,
+        target_new_listings=1.0,
+        smoothing=0.3,
+        prior_interval=PRIOR_SCRAPE_INTERVAL,
+        max_growth=2,
+        max_pages=MAX_SEARCH_PAGES,
+        burst_seconds=10,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.requests_per_minute = requests_per_minute
+        self.target_new_listings = target_new_listings
+        self.smoothing = smoothing
+        self.prior_interval = prior_interval
+        self.max_growth = max_growth
+        self.max_pages = max_pages
+        self.burst_seconds = burst_seconds
+        self.tokens = None
+        self.refilled_at = None
+        # term -> pages taken from the bucket for its scrape in flight
+        self.charged = {}
+        # earliest time the next new term may have its first scrape
+        self.next_start = None
+        self.rates = {}
+        # term -> interval wanted from its rate, before the budget stretches it
+        self.intervals = {}
+        # term -> smoothed number of search page requests per scrape
+        self.pages = {}
+        self.last_scraped = {}
+        self.due_at = {}
+        # (due_at, term), entries no longer matching self.due_at are skipped
+        self.heap = []
+
+    # adds new terms (due one after the other from now) and forgets removed ones
+    def set_terms(self, search_terms, now):
+        search_terms = set(search_terms)
+        for term in list(self.due_at):
+            if term not in search_terms:
+                del self.due_at[term]
+                self.rates.pop(term, None)
+                self.intervals.pop(term, None)
+                self.pages.pop(term, None)
+                self.last_scraped.pop(term, None)
+        next_start = now if self.next_start is None else max(now, self.next_start)
+        for term in sorted(search_terms):
+            if term not in self.due_at:
+                # a first scrape follows every page, to fill the term's seen index
+                self.schedule(term, next_start)
+                next_start += self.max_pages * 60 / self.requests_per_minute
+        self.next_start = next_start
+
+    # capacity of the token bucket, enough for at least one full scrape
+    def capacity(self):
+        return max(self.requests_per_minute * self.burst_seconds / 60, self.max_pages)
+
+    def refill(self, now):
+        if self.tokens is None:
+            self.tokens = self.capacity()
+        else:
+            elapsed = max(now - self.refilled_at, 0)
+            self.tokens = min(self.capacity(), self.tokens + elapsed * self.requests_per_minute / 60)
+        self.refilled_at = now
+
+    def schedule(self, term, due_at):
+        self.due_at[term] = due_at
+        heapq.heappush(self.heap, (due_at, term))
+
+    # returns the terms that are due, they are not due again until rescheduled
+    def pop_due(self, now):
+        self.refill(now)
+        due_terms = []
+        while self.heap and self.heap[0][0] <= now:
+            due_at, term = self.heap[0]
+            if self.due_at.get(term) != due_at:
+                heapq.heappop(self.heap)
+                continue
+            pages = self.pages.get(term, self.max_pages)
+            if self.tokens < pages:
+                # the rest wait for the budget, earliest due first
+                break
+            heapq.heappop(self.heap)
+            self.tokens -= pages
+            self.charged[term] = pages
+            self.due_at[term] = None
+            due_terms.append(term)
+        return due_terms
+
+    def next_due(self):
+        while self.heap and self.due_at.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    # new_listings is None when the scrape failed, which keeps the current rate
+    # pages: search page requests the scrape sent, None when unknown
+    def record(self, term, new_listings, now, pages=None):
+        charged = self.charged.pop(term, None)
+        if charged is not None and pages is not None:
+            # settle the estimate with the requests actually sent
+            self.refill(now)
+            self.tokens += charged - pages
+        if term not in self.due_at:
+            return
+        if pages is not None:
+            previous_pages = self.pages.get(term, pages)
+            self.pages[term] = (1 - self.smoothing) * previous_pages + self.smoothing * pages
+        last_scraped = self.last_scraped.get(term)
+        if new_listings is not None and last_scraped is not None and now > last_scraped:
+            observed = new_listings / (now - last_scraped)
+            # one short window says little, so the first one is blended into the prior
+            rate = self.rates.get(term, self.target_new_listings / self.prior_interval)
+            self.rates[term] = (1 - self.smoothing) * rate + self.smoothing * observed
+            self.intervals[term] = self.next_interval(term)
+        if new_listings is not None:
+            self.last_scraped[term] = now
+        self.schedule(term, now + self.interval(term))
+
+    def desired_interval(self, term):
+        # no history yet, look again soon
+        return self.intervals.get(term, self.min_interval)
+
+    # the interval the term's rate asks for, at most max_growth times the previous one
+    def next_interval(self, term):
+        rate = self.rates[term]
+        wanted = self.target_new_listings / rate if rate > 0 else self.max_interval
+        previous = self.intervals.get(term, self.prior_interval)
+        return min(self.max_interval, max(self.min_interval, min(wanted, previous * self.max_growth)))
+
+    def interval(self, term):
+        requests_per_minute = sum(
+            60 / self.desired_interval(t) * self.pages.get(t, self.max_pages) for t in self.due_at
+        )
+        stretch = max(1, requests_per_minute / self.requests_per_minute)
+        return self.desired_interval(term) * stretch
@@ -1,17 +1,17 @@
 from scrapy.crawler import CrawlerProcess
+from scraper.carousellCrawlProfile import CarousellCrawlProfile
 from scraper.carousellSpider import CarousellSpider
 
 class CarousellScraper():
 
-    def __init__(self, search_terms):
+    def __init__(self, search_terms, crawl_profile=None):
         self.search_terms = search_terms
+        self.crawl_profile = crawl_profile if crawl_profile is not None else CarousellCrawlProfile.load()
     
     def start(self):
-        process = CrawlerProcess(settings = {
-            'USER_AGENT': 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/118.0',
-        })
+        process = CrawlerProcess(settings = self.crawl_profile.scrapy_settings())
 
         spider = CarousellSpider
         spider.search_terms = self.search_terms
         process.crawl(spider)
-        process.start()
\ No newline at end of file
+        process.start()
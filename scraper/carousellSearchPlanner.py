@@ -0,0 +1,37 @@
+from config.definitions import CAROUSELL_URL
+from urllib.parse import quote, unquote
+
+
+# "  iPhone%2015 " and "iphone 15" are the same query
+def canonicalize_term(search_term):
+    return " ".join(unquote(search_term).casefold().split())
+
+
+# page: pages after the first use "&page=N", which has not been checked against
+# the live site (see MAX_SEARCH_PAGES)
+def search_url(search_term, page=1, base_url=CAROUSELL_URL):
+    url = (
+        f"{base_url}/search/{quote(canonicalize_term(search_term), safe='')}"
+        "?addRecent=false&canChangeKeyword=true&includeSuggestions=false"
+        "&t-search_query_source=direct_search&tab=marketplace"
+    )
+    return url if page == 1 else f"{url}&page={page}"
+
+
+# every spelling of a term shares the same files
+def term_file_name(search_term):
+    return quote(canonicalize_term(search_term).replace(" ", "_"), safe="")
+
+
+def plan_searches(search_items):
+    """
+    Groups the (user_id, search_term, exclude) items by canonical term, so every
+    distinct query is crawled once per cycle and its results fanned out to all of
+    its subscribers.
+
+    Returns a dict of {canonical_term: [search_item, ...]}
+    """
+    plan = {}
+    for search_item in search_items:
+        plan.setdefault(canonicalize_term(search_item[1]), []).append(search_item)
+    return plan
@@ -0,0 +1,57 @@
+from config.definitions import DATA_DIR, SEEN_INDEX_RETENTION
+from scraper.carousellSearchPlanner import term_file_name
+import numpy as np
+import os
+
+SEEN_DIR = os.path.join(DATA_DIR, "seen")
+
+
+class CarousellSeenIndex():
+    """
+    The listing IDs already seen for one search, kept as a sorted array of
+    unsigned 64-bit ints in data/seen/<term>.bin. Listing IDs grow over time, so
+    only the newest `retention` IDs are kept.
+    """
+
+    def __init__(self, search_term, retention=SEEN_INDEX_RETENTION):
+        self.path = os.path.join(SEEN_DIR, f"{term_file_name(search_term)}.bin")
+        self.retention = retention
+        self.ids = np.zeros(0, dtype="<u8")
+        if os.path.exists(self.path):
+            self.ids = np.fromfile(self.path, dtype="<u8")
+
+    def is_empty(self):
+        return len(self.ids) == 0
+
+    def __contains__(self, listing_id):
+        return bool(self.seen(np.array([listing_id], dtype=np.uint64))[0])
+
+    # mask of the given IDs that have been seen
+    def seen(self, ids):
+        index = np.searchsorted(self.ids, ids)
+        found = index < len(self.ids)
+        found[found] = self.ids[index[found]] == ids[found]
+        # anything older than the retained window has been seen before
+        if len(self.ids) >= self.retention:
+            found |= ids < self.ids[0]
+        return found
+
+    # returns the IDs (in the given order) that have not been seen yet
+    def unseen(self, listing_ids):
+        ids = np.array(listing_ids, dtype=np.uint64)
+        return [int(listing_id) for listing_id in ids[~self.seen(ids)]]
+
+    # merges the unseen IDs into the sorted array, without re-sorting what is
+    # there; save() writes them out
+    def add(self, listing_ids):
+        ids = np.unique(np.array(listing_ids, dtype=np.uint64))
+        new_ids = ids[~self.seen(ids)]
+        if len(new_ids):
+            merged = np.insert(self.ids, np.searchsorted(self.ids, new_ids), new_ids)
+            self.ids = merged[-self.retention:]
+
+    def save(self):
+        os.makedirs(SEEN_DIR, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        self.ids.tofile(tmp_path)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,210 @@
+from config.definitions import SCRAPE_BUDGET, SHARD_COORDINATOR_ADDRESS
+from scraper.carousellEventPublisher import load_ipc_authkey
+from scraper.carousellShardRing import ShardRing
+from scraper.carousellSubscriptionStore import CarousellSubscriptionStore
+from monitoring import metrics
+from multiprocessing.connection import Listener, wait
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# seconds between two checks for changed subscriptions
+TICK_INTERVAL = 1
+# seconds a new connection has to introduce itself
+JOIN_TIMEOUT = 5
+
+WORKER_CHANGES = metrics.counter("scraper_shard_worker_changes_total", "Scraper workers joining or leaving, by change")
+TERMS_MOVED = metrics.counter("scraper_shard_terms_moved_total", "Search terms handed from one scraper worker to another")
+
+
+class CarousellShardCoordinator():
+    """
+    Splits the monitored search terms between scraper workers (see
+    scraper/carousellShardWorker.py) with a consistent hash ring, and
+    rebalances when a worker joins or leaves.
+
+    Workers connect to `address` with the same authkey as the bot connection.
+    Each one is sent the full list of its terms whenever it changes. A term
+    moving away from a live worker is only handed to its new worker once the
+    old one reports it released, so no term is scraped by two workers at once.
+    The workers write their scrapes to the shared listing store and publish
+    their own scrape events to the bot.
+    """
+
+    def __init__(self, address=SHARD_COORDINATOR_ADDRESS, subscription_store=None, requests_per_minute=SCRAPE_BUDGET):
+        self.listener = Listener(address, authkey=load_ipc_authkey())
+        self.subscription_store = (
+            subscription_store if subscription_store is not None else CarousellSubscriptionStore()
+        )
+        # split between the workers, so adding workers does not raise the load on Carousell
+        self.requests_per_minute = requests_per_minute
+        self.ring = ShardRing()
+        # worker name -> connection
+        self.connections = {}
+        self.joined = queue.Queue()
+        self.terms = set()
+        self.subscription_version = 0
+        # term -> the worker currently scraping it
+        self.owners = {}
+        # term -> the worker that still has to release it
+        self.releasing = {}
+        # worker name -> last assignment sent to it
+        self.sent = {}
+        self.running = True
+
+    @property
+    def address(self):
+        return self.listener.address
+
+    # runs in its own thread, accept() blocks
+    def accept_workers(self):
+        while self.running:
+            try:
+                conn = self.listener.accept()
+            except Exception as e:
+                if self.running:
+                    logger.warning("Could not accept a worker: %s", e)
+                continue
+            try:
+                message = conn.recv() if conn.poll(JOIN_TIMEOUT) else None
+            except (EOFError, OSError):
+                message = None
+            if not isinstance(message, dict) or message.get("type") != "join":
+                conn.close()
+                continue
+            self.joined.put((message["worker"], conn))
+
+    def add_joined_workers(self):
+        changed = False
+        while True:
+            try:
+                worker, conn = self.joined.get_nowait()
+            except queue.Empty:
+                return changed
+            if worker in self.connections:
+                # a worker rejoining under the same name starts without terms,
+                # so it will never release the ones the old connection held
+                self.remove_worker(worker)
+            self.connections[worker] = conn
+            self.ring.add(worker)
+            WORKER_CHANGES.inc(change="join")
+            logger.info("Worker %s joined, %d workers", worker, len(self.connections))
+            changed = True
+
+    def remove_worker(self, worker):
+        conn = self.connections.pop(worker, None)
+        if conn is None:
+            return
+        conn.close()
+        self.sent.pop(worker, None)
+        self.ring.remove(worker)
+        # its terms are handed out again by the next rebalance()
+        for terms in (self.owners, self.releasing):
+            for term in [term for term, owner in terms.items() if owner == worker]:
+                del terms[term]
+        WORKER_CHANGES.inc(change="leave")
+        logger.info("Worker %s left, %d workers", worker, len(self.connections))
+
+    # applies only the subscriptions changed since the last reload
+    def reload_search_terms(self):
+        version = self.subscription_store.version()
+        if version == self.subscription_version:
+            return False
+        changed_terms = {
+            change["term"] for change in self.subscription_store.changed_since(self.subscription_version)
+        }
+        self.subscription_version = version
+        for term in changed_terms:
+            if self.subscription_store.term_subscriptions(term):
+                self.terms.add(term)
+            else:
+                self.terms.discard(term)
+        logger.info("Monitoring %d search terms", len(self.terms))
+        return True
+
+    # reads the messages waiting on the workers' connections
+    def receive(self, timeout):
+        if not self.connections:
+            time.sleep(timeout)
+            return False
+        workers = {conn: worker for worker, conn in self.connections.items()}
+        changed = False
+        for conn in wait(list(workers), timeout):
+            worker = workers[conn]
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                self.remove_worker(worker)
+                changed = True
+                continue
+            if message.get("type") == "released":
+                for term in message["terms"]:
+                    if self.releasing.get(term) == worker:
+                        del self.releasing[term]
+                        changed = True
+        return changed
+
+    # moves every term towards its worker on the ring
+    def rebalance(self):
+        for term in list(self.owners):
+            if term not in self.terms or self.owners[term] not in self.connections:
+                del self.owners[term]
+        for term in list(self.releasing):
+            if term not in self.terms or self.releasing[term] not in self.connections:
+                del self.releasing[term]
+
+        for term in self.terms:
+            if term in self.releasing:
+                continue
+            target = self.ring.owner(term)
+            owner = self.owners.get(term)
+            if owner == target:
+                continue
+            TERMS_MOVED.inc()
+            if owner is not None:
+                # the new worker gets the term once the old one has released it
+                del self.owners[term]
+                self.releasing[term] = owner
+            elif target is not None:
+                self.owners[term] = target
+        self.send_assignments()
+
+    def send_assignments(self):
+        assignment = {worker: [] for worker in self.connections}
+        for term, owner in self.owners.items():
+            assignment[owner].append(term)
+        requests_per_minute = self.requests_per_minute / max(len(self.connections), 1)
+        for worker, terms in assignment.items():
+            message = {"type": "assign", "terms": sorted(terms), "requests_per_minute": requests_per_minute}
+            if self.sent.get(worker) == message:
+                continue
+            try:
+                self.connections[worker].send(message)
+                self.sent[worker] = message
+            except OSError as e:
+                # noticed as a closed connection by the next receive()
+                logger.warning("Could not send terms to worker %s: %s", worker, e)
+
+    def run_cycle(self):
+        changed = self.add_joined_workers()
+        changed |= self.receive(TICK_INTERVAL)
+        try:
+            changed |= self.reload_search_terms()
+        except Exception as e:
+            # keep the previous terms if the store is busy
+            logger.warning("Could not reload monitored searches: %s", e)
+        if changed:
+            self.rebalance()
+
+    def start(self):
+        threading.Thread(target=self.accept_workers, name="shard-accept", daemon=True).start()
+        logger.info("Shard coordinator listening on %s:%s", *self.address)
+        while self.running:
+            self.run_cycle()
+        self.listener.close()
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,61 @@
+from config.definitions import SHARD_VIRTUAL_NODES
+from bisect import bisect
+import hashlib
+
+
+class ShardRing():
+    """
+    Consistent hash ring mapping canonical search terms to scraper workers.
+
+    Every worker is placed on the ring at `virtual_nodes` points, and a term
+    belongs to the first worker point at or after the term's own hash. When a
+    worker joins or leaves, only the terms between its points and the previous
+    ones move, about 1/N of them, and every other term keeps its worker.
+    """
+
+    def __init__(self, workers=(), virtual_nodes=SHARD_VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self.workers = set()
+        # sorted (point, worker) pairs
+        self.points = []
+        for worker in workers:
+            self.add(worker)
+
+    def __len__(self):
+        return len(self.workers)
+
+    def __contains__(self, worker):
+        return worker in self.workers
+
+    def add(self, worker):
+        if worker in self.workers:
+            return
+        self.workers.add(worker)
+        self.points = sorted(
+            self.points + [(ring_hash(f"{worker}#{i}"), worker) for i in range(self.virtual_nodes)]
+        )
+
+    def remove(self, worker):
+        self.workers.discard(worker)
+        self.points = [point for point in self.points if point[1] != worker]
+
+    # the worker a term belongs to, None while the ring is empty
+    def owner(self, term):
+        if not self.points:
+            return None
+        i = bisect(self.points, (ring_hash(term), ""))
+        return self.points[i % len(self.points)][1]
+
+    # {worker: [term, ...]} for every worker on the ring
+    def assign(self, terms):
+        assignment = {worker: [] for worker in self.workers}
+        for term in terms:
+            owner = self.owner(term)
+            if owner is not None:
+                assignment[owner].append(term)
+        return assignment
+
+
+# stable across processes and hosts, unlike hash()
+def ring_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
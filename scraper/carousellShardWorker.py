@@ -0,0 +1,83 @@
+from config.definitions import SHARD_COORDINATOR_ADDRESS
+from scraper.carousellCrawlProfile import CarousellCrawlProfile
+from scraper.carousellDaemon import CarousellDaemon
+from scraper.carousellEventPublisher import CarousellEventPublisher, load_ipc_authkey
+from monitoring.metrics import start_metrics_export
+from multiprocessing.connection import Client
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CarousellShardWorker(CarousellDaemon):
+    """
+    A CarousellDaemon scraping only the terms assigned to it by a
+    CarousellShardCoordinator, instead of every monitored search.
+
+    Terms taken away are reported back as released once no crawl of them is
+    in flight. A worker cut off from the coordinator stops scraping, since its
+    terms are handed to the other workers, and rejoins on the next tick.
+    """
+
+    def __init__(self, name, coordinator_address=SHARD_COORDINATOR_ADDRESS, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.coordinator_address = coordinator_address
+        self.conn = None
+        # terms taken away while a crawl of them was in flight
+        self.releasing = set()
+
+    def connect(self):
+        self.conn = Client(self.coordinator_address, authkey=load_ipc_authkey())
+        self.conn.send({"type": "join", "worker": self.name})
+        logger.info("Joined the shard coordinator as %s", self.name)
+
+    # applies the latest assignment from the coordinator
+    def reload_search_terms(self):
+        if self.conn is None:
+            self.connect()
+        assignment = None
+        try:
+            while self.conn.poll():
+                message = self.conn.recv()
+                if message["type"] == "assign":
+                    assignment = message
+        except (EOFError, OSError):
+            logger.warning("Lost the shard coordinator, dropping %d search terms", len(self.search_terms))
+            self.conn = None
+            self.releasing.clear()
+            self.set_search_terms([])
+            return
+
+        if assignment is not None:
+            terms = assignment["terms"]
+            self.releasing.update(term for term in self.search_terms if term not in set(terms))
+            self.releasing.difference_update(terms)
+            self.scheduler.requests_per_minute = assignment["requests_per_minute"]
+            self.set_search_terms(terms)
+
+        released = [term for term in self.releasing if term not in self.in_flight]
+        if released:
+            self.conn.send({"type": "released", "terms": released})
+            self.releasing.difference_update(released)
+
+    def set_search_terms(self, terms):
+        self.search_terms = dict.fromkeys(terms)
+        self.scheduler.set_terms(terms, time.time())
+        logger.info("Monitoring %d search terms", len(self.search_terms))
+
+
+# entry point of a worker process
+def run_worker(name, coordinator_address=SHARD_COORDINATOR_ADDRESS, crawl_profile_path=None):
+    start_metrics_export(f"scraper-{name}")
+    crawl_profile = (
+        CarousellCrawlProfile.load(crawl_profile_path) if crawl_profile_path else CarousellCrawlProfile.load()
+    )
+    worker = CarousellShardWorker(
+        name,
+        coordinator_address,
+        event_publisher=CarousellEventPublisher(),
+        crawl_profile=crawl_profile,
+    )
+    worker.start()
@@ -1,36 +1,215 @@
-from config.definitions import ROOT_DIR
+from config.definitions import CAROUSELL_URL, MAX_SEARCH_PAGES, SEARCH_PAGE_WINDOW
+from scraper.carousellEventPublisher import CarousellEventPublisher, scrape_event
+from scraper.carousellFingerprint import PageFingerprint
+from scraper.carousellListing import recency_key
+from scraper.carousellListingState import CarousellListingState
+from scraper.carousellListingStore import CarousellListingStore
 from scraper.carousellResponseParser import CarousellResponseParser
+from scraper.carousellSearchPlanner import search_url
+from scraper.carousellSeenIndex import CarousellSeenIndex
+from monitoring import metrics
 import scrapy
-import csv
-import os
+import time
+
+REQUESTS = metrics.counter("scraper_requests_total", "Search page requests sent")
+RESPONSES = metrics.counter("scraper_responses_total", "Search page responses by status")
+FAILURES = metrics.counter("scraper_request_failures_total", "Search page requests that failed after retries")
+UNCHANGED_PAGES = metrics.counter("scraper_unchanged_pages_total", "Search pages skipped as unchanged")
+NEW_LISTINGS = metrics.counter("scraper_new_listings_total", "Listings seen for the first time")
+PRICE_DROPS = metrics.counter("scraper_price_drops_total", "Tracked listings whose price fell")
+BUMPS = metrics.counter("scraper_bumps_total", "Tracked listings that were bumped")
+FETCH_SECONDS = metrics.histogram("scraper_fetch_seconds", "Download latency of a search page")
+PARSE_SECONDS = metrics.histogram("scraper_parse_seconds", "Time to parse one search page")
+CARDS_PER_PAGE = metrics.histogram("scraper_cards_per_page", "Listing cards parsed from one search page", metrics.COUNT_BUCKETS)
+WRITE_SECONDS = metrics.histogram("scraper_write_seconds", "Time to store one scrape of a term")
 
 class CarousellRequest(scrapy.Request):
     search_term = ''
+    page = 1
+
+class SearchCrawl():
+    """
+    State of one term's crawl across its result pages.
+    """
+
+    def __init__(self, search_term, listing_store):
+        self.search_term = search_term
+        self.listing_store = listing_store
+        self.seen_index = CarousellSeenIndex(search_term)
+        self.listing_state = CarousellListingState(search_term)
+        self.scraped_at = time.time()
+        # page -> parsed listings, None for pages unchanged since the last scrape
+        self.pages = {}
+        self.fingerprints = {}
+        self.previous_fingerprints = {}
+        self.next_page = 1
+        self.in_flight = 0
+        self.exhausted = False
+
+    # IDs on this page that were neither seen before nor on another page of this crawl
+    def has_unseen(self, item_list):
+        collected = {
+            item["listing_id"] for items in self.pages.values() if items is not None for item in items
+        }
+        return any(
+            item["listing_id"] not in collected and item["listing_id"] not in self.seen_index
+            for item in item_list
+        )
+
+    def previous_fingerprint(self, page):
+        if page not in self.previous_fingerprints:
+            self.previous_fingerprints[page] = self.listing_store.fingerprint(self.search_term, page)
+        return self.previous_fingerprints[page]
+
+    # revalidation headers from the last time this page was fetched
+    def conditional_headers(self, page):
+        previous = self.previous_fingerprint(page)
+        headers = {}
+        if previous is not None and previous.etag is not None:
+            headers["If-None-Match"] = previous.etag
+        if previous is not None and previous.last_modified is not None:
+            headers["If-Modified-Since"] = previous.last_modified
+        return headers
+
+    def is_unchanged(self):
+        return all(item_list is None for item_list in self.pages.values())
 
 class CarousellSpider(scrapy.Spider):
     name = "carousell"
     search_terms = []
+    max_pages = MAX_SEARCH_PAGES
+    page_window = SEARCH_PAGE_WINDOW
+    # 304 Not Modified answers to conditional requests reach parse()
+    handle_httpstatus_list = [304]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.listing_store = CarousellListingStore()
+        # the daemon passes in one publisher shared by all of its crawls
+        if getattr(self, "event_publisher", None) is None:
+            self.event_publisher = CarousellEventPublisher()
 
     def start_requests(self):
         for search_term in self.search_terms:
-            url = f'https://www.carousell.sg/search/{search_term.replace(" ", "%20")}?addRecent=false&canChangeKeyword=true&includeSuggestions=false&t-search_query_source=direct_search&tab=marketplace'
-            request = CarousellRequest(url=url, callback=self.parse)
-            request.search_term = search_term
+            yield from self.next_requests(SearchCrawl(search_term, self.listing_store), 1)
+
+    # keeps up to `page_window` pages of a term in flight
+    def next_requests(self, crawl, count):
+        for _ in range(count):
+            if crawl.exhausted or crawl.next_page > self.max_pages:
+                return
+            request = CarousellRequest(
+                url=search_url(
+                    crawl.search_term,
+                    crawl.next_page,
+                    self.settings.get("CAROUSELL_BASE_URL", CAROUSELL_URL),
+                ),
+                headers=crawl.conditional_headers(crawl.next_page),
+                callback=self.parse,
+                errback=self.page_failed,
+                cb_kwargs={"crawl": crawl},
+            )
+            request.search_term = crawl.search_term
+            request.page = crawl.next_page
+            crawl.next_page += 1
+            crawl.in_flight += 1
+            REQUESTS.inc()
             yield request
 
-    def parse(self, response):
-        item_list = CarousellResponseParser(response).parse()
+    def parse(self, response, crawl):
+        crawl.in_flight -= 1
+        page = response.request.page
+        RESPONSES.inc(status=response.status)
+        FETCH_SECONDS.observe(response.meta.get("download_latency"))
+        previous = crawl.previous_fingerprint(page)
+        if response.status == 304:
+            fingerprint = previous
+        else:
+            fingerprint = PageFingerprint.from_response(response)
+        crawl.fingerprints[page] = fingerprint
+
+        if fingerprint is not None and fingerprint.matches(previous):
+            # nothing on this page changed, so it cannot hold new listings either
+            crawl.pages[page] = None
+            crawl.exhausted = True
+            UNCHANGED_PAGES.inc()
+        else:
+            # card ages are turned into posting times relative to now
+            seen_at = time.time()
+            with PARSE_SECONDS.time():
+                item_list = CarousellResponseParser(response, scraped_at=seen_at).parse()
+            CARDS_PER_PAGE.observe(len(item_list))
+            # start of the seen-to-notified delay measured by the bot
+            for item in item_list:
+                item["seen_at"] = seen_at
+            # stop following pages once one adds nothing new
+            if crawl.seen_index.is_empty() or crawl.has_unseen(item_list):
+                yield from self.next_requests(crawl, self.page_window - crawl.in_flight)
+            else:
+                crawl.exhausted = True
+            crawl.pages[page] = item_list
+
+        if crawl.in_flight == 0:
+            yield from self.finish(crawl)
+
+    def page_failed(self, failure):
+        crawl = failure.request.cb_kwargs["crawl"]
+        crawl.in_flight -= 1
+        crawl.exhausted = True
+        FAILURES.inc()
+        if crawl.in_flight == 0 and crawl.pages:
+            yield from self.finish(crawl)
+
+    def finish(self, crawl):
+        search_term = crawl.search_term
+
+        # skip the write and the push when the results have not changed
+        if crawl.is_unchanged():
+            yield {"search_term": search_term, "new_listings": 0, "requests": crawl.next_page - 1}
+            return
+
+        # listings can move between pages while they are fetched
+        item_list = []
+        collected = set()
+        for page in sorted(crawl.pages):
+            page_items = crawl.pages[page]
+            if page_items is None:
+                # the page's fingerprint can be older than the term's latest scrape
+                page_items = self.listing_store.latest_listings(crawl.fingerprints[page].listing_ids)
+            for item in page_items:
+                if item["listing_id"] not in collected:
+                    collected.add(item["listing_id"])
+                    item_list.append(item)
+        item_list.sort(key=recency_key)
 
-        csv_file_path = os.path.join(ROOT_DIR, "data", f'{response.request.search_term.replace(" ", "_")}.csv')
+        self.mark_new_listings(crawl.seen_index, item_list)
+        price_drops, bumps = crawl.listing_state.update(item_list, crawl.scraped_at)
+        with WRITE_SECONDS.time():
+            scrape_id = self.listing_store.add_scrape(search_term, item_list, crawl.scraped_at)
+            self.listing_store.save_fingerprints(search_term, crawl.fingerprints)
+            # only once the scrape is stored, so a failed write leaves its listings new
+            crawl.seen_index.save()
+            crawl.listing_state.save()
 
-        with open(csv_file_path, 'w', newline='') as csv_file:
-            # Extract the fieldnames from the keys of the first dictionary in the array
-            fieldnames = item_list[0].keys()
+        # tell the bot which term changed, along with its new and changed listings
+        new_listings = [item for item in item_list if item["is_new"]]
+        NEW_LISTINGS.inc(len(new_listings))
+        PRICE_DROPS.inc(len(price_drops))
+        BUMPS.inc(len(bumps))
+        self.event_publisher.publish(
+            scrape_event(search_term, scrape_id, crawl.scraped_at, new_listings, price_drops, bumps)
+        )
 
-            csv_writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+        # lets the daemon adapt how often this term is scraped, and count its requests
+        yield {"search_term": search_term, "new_listings": len(new_listings), "requests": crawl.next_page - 1}
 
-            # Write the header to the CSV file
-            csv_writer.writeheader()
+    # flags the listings whose IDs have not been seen in an earlier scrape
+    def mark_new_listings(self, seen_index, item_list):
+        listing_ids = [item["listing_id"] for item in item_list]
 
-            csv_writer.writerows(item_list)
+        # the first scrape of a term only fills the index
+        new_ids = set() if seen_index.is_empty() else set(seen_index.unseen(listing_ids))
+        for item in item_list:
+            item["is_new"] = item["listing_id"] in new_ids
 
+        seen_index.add(listing_ids)
@@ -0,0 +1,196 @@
+from config.definitions import MONITORED_SEARCHES_PATH, SUBSCRIPTION_DB_PATH
+from scraper.carousellSearchPlanner import canonicalize_term
+import json
+import os
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    user_id TEXT NOT NULL,
+    search_term TEXT NOT NULL,
+    term TEXT NOT NULL,
+    min_price INTEGER,
+    max_price INTEGER,
+    exclude TEXT NOT NULL DEFAULT '[]',
+    alerts TEXT NOT NULL DEFAULT '[]',
+    version INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, search_term)
+);
+CREATE INDEX IF NOT EXISTS subscriptions_term ON subscriptions (term) WHERE NOT deleted;
+CREATE INDEX IF NOT EXISTS subscriptions_version ON subscriptions (version);
+"""
+
+
+class CarousellSubscriptionStore():
+    """
+    Every user's monitored searches in data/subscriptions.db, shared by the bot
+    and the scraper.
+
+    Each change is a single-row upsert or delete in its own transaction, and
+    stamps the row with the next version number. Deleted searches stay behind
+    as tombstones, so changed_since(version) also reports removals, and a
+    reader only has to compare version() with the last one it saw.
+    """
+
+    def __init__(self, db_path=SUBSCRIPTION_DB_PATH, json_path=MONITORED_SEARCHES_PATH):
+        self.db_path = db_path
+        self.local = threading.local()
+        self.connection().executescript(SCHEMA)
+        self.import_json(json_path)
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    # one-off import of the monitored_searches.json used before this store
+    def import_json(self, json_path):
+        if json_path is None or not os.path.exists(json_path):
+            return
+        with open(json_path, "r", encoding="utf-8") as f:
+            monitored_searches = json.load(f)
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # the other process may have imported it already
+            if conn.execute("SELECT 1 FROM subscriptions LIMIT 1").fetchone() is None:
+                for user_id, user in monitored_searches.items():
+                    for search_term, search in user["searches"].items():
+                        self.write(
+                            conn,
+                            user_id,
+                            search_term,
+                            search.get("min_price"),
+                            search.get("max_price"),
+                            search.get("exclude", []),
+                            search.get("alerts", []),
+                        )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        try:
+            os.replace(json_path, json_path + ".migrated")
+        except FileNotFoundError:
+            pass
+
+    def write(self, conn, user_id, search_term, min_price, max_price, exclude, alerts, deleted=False):
+        version = self.next_version(conn)
+        conn.execute(
+            """INSERT INTO subscriptions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, search_term) DO UPDATE SET
+                min_price = excluded.min_price, max_price = excluded.max_price,
+                exclude = excluded.exclude, alerts = excluded.alerts,
+                version = excluded.version, deleted = excluded.deleted""",
+            (
+                str(user_id),
+                search_term,
+                canonicalize_term(search_term),
+                min_price,
+                max_price,
+                json.dumps(list(exclude)),
+                json.dumps(list(alerts)),
+                version,
+                int(deleted),
+            ),
+        )
+
+    def next_version(self, conn):
+        return conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM subscriptions").fetchone()[0]
+
+    def transaction(self, action, *args):
+        conn = self.connection()
+        # IMMEDIATE takes the write lock up front, so versions are never handed out twice
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = action(conn, *args)
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def upsert(self, user_id, search_term, min_price=None, max_price=None, exclude=(), alerts=()):
+        self.transaction(self.write, user_id, search_term, min_price, max_price, exclude, alerts)
+
+    def delete(self, user_id, search_term):
+        def delete_row(conn):
+            row = conn.execute(
+                "SELECT 1 FROM subscriptions WHERE user_id = ? AND search_term = ? AND NOT deleted",
+                (str(user_id), search_term),
+            ).fetchone()
+            if row is not None:
+                self.write(conn, user_id, search_term, None, None, (), (), deleted=True)
+            return row is not None
+
+        return self.transaction(delete_row)
+
+    def set_alerts(self, user_id, search_term, alerts):
+        def update_alerts(conn):
+            conn.execute(
+                "UPDATE subscriptions SET alerts = ?, version = ? WHERE user_id = ? AND search_term = ? AND NOT deleted",
+                (json.dumps(list(alerts)), self.next_version(conn), str(user_id), search_term),
+            )
+
+        self.transaction(update_alerts)
+
+    # the highest version written so far, cheap enough to poll
+    def version(self):
+        return self.connection().execute("SELECT COALESCE(MAX(version), 0) FROM subscriptions").fetchone()[0]
+
+    # every row written after `version`, including the tombstones of deleted searches
+    def changed_since(self, version):
+        rows = self.connection().execute(
+            "SELECT * FROM subscriptions WHERE version > ? ORDER BY version", (version,)
+        )
+        return [subscription_from_row(row) for row in rows]
+
+    # {search_term: search} of one user
+    def user_searches(self, user_id):
+        rows = self.connection().execute(
+            "SELECT * FROM subscriptions WHERE user_id = ? AND NOT deleted ORDER BY search_term",
+            (str(user_id),),
+        )
+        return {row["search_term"]: subscription_from_row(row) for row in rows}
+
+    def search(self, user_id, search_term):
+        return self.user_searches(user_id).get(search_term)
+
+    # every live subscription on one canonical term
+    def term_subscriptions(self, term):
+        rows = self.connection().execute(
+            "SELECT * FROM subscriptions WHERE term = ? AND NOT deleted", (canonicalize_term(term),)
+        )
+        return [subscription_from_row(row) for row in rows]
+
+    def all_subscriptions(self):
+        rows = self.connection().execute("SELECT * FROM subscriptions WHERE NOT deleted")
+        return [subscription_from_row(row) for row in rows]
+
+    # (user_id, search_term, exclude) for every live subscription, as plan_searches expects
+    def search_items(self):
+        return [
+            (subscription["user_id"], subscription["search_term"], subscription["exclude"])
+            for subscription in self.all_subscriptions()
+        ]
+
+
+def subscription_from_row(row):
+    return {
+        "user_id": row["user_id"],
+        "search_term": row["search_term"],
+        "term": row["term"],
+        "min_price": row["min_price"],
+        "max_price": row["max_price"],
+        "exclude": json.loads(row["exclude"]),
+        "alerts": json.loads(row["alerts"]),
+        "version": row["version"],
+        "deleted": bool(row["deleted"]),
+    }
@@ -0,0 +1,76 @@
+import numpy as np
+import re
+
+
+class ExcludeFilter():
+    """
+    The exclude words of several subscribers compiled into one regex, so each
+    title is scanned once no matter how many subscribers or words there are.
+
+    Every distinct word gets a bit. A title's mask holds the bits of the words
+    it contains, and a subscriber keeps the title when it shares no bit with
+    that subscriber's own mask. Words match whole words, ignoring case.
+    """
+
+    def __init__(self, word_lists):
+        # word_lists: one list of exclude words per subscriber
+        word_lists = [normalize_words(words) for words in word_lists]
+        words = sorted(set().union(*word_lists))
+        self.bits = {word: 1 << i for i, word in enumerate(words)}
+        self.pattern = None
+        if words:
+            self.pattern = re.compile(r"(?<!\w)" + trie_pattern(words) + r"(?!\w)")
+        # plain integers once there are more words than bits in a uint64
+        self.dtype = np.uint64 if len(words) <= 64 else object
+        self.subscriber_masks = np.array(
+            [sum(self.bits[word] for word in words) for words in word_lists], dtype=self.dtype
+        )
+
+    def title_masks(self, titles):
+        masks = np.zeros(len(titles), dtype=self.dtype)
+        if self.pattern is None:
+            return masks
+        for i, title in enumerate(titles):
+            if not title:
+                continue
+            mask = 0
+            for match in self.pattern.finditer(title.casefold()):
+                mask |= self.bits[match.group()]
+            masks[i] = mask
+        return masks
+
+    # for each title, whether the subscriber at `subscriber` keeps it
+    def keep_mask(self, title_masks, subscriber):
+        return (title_masks & self.subscriber_masks[subscriber]) == 0
+
+    # the listings none of the first subscriber's words appear in
+    def keep(self, listings):
+        if self.pattern is None:
+            return listings
+        keep = self.keep_mask(self.title_masks([listing.title for listing in listings]), 0)
+        return [listing for listing, kept in zip(listings, keep) if kept]
+
+
+# one regex for all the words with shared prefixes merged, so matching a
+# position costs the same however many words there are
+def trie_pattern(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def pattern(node):
+        branches = [re.escape(char) + pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        alternatives = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # a word ending here may also be the prefix of a longer one, tried first
+        return f"(?:{alternatives})?" if "" in node else alternatives
+
+    return pattern(trie)
+
+
+def normalize_words(words):
+    return {word.strip().casefold() for word in words or () if word.strip()}
@@ -0,0 +1,129 @@
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right
+from scraper.carousellListing import LISTING_FIELDS
+from scraper.carousellSearchPlanner import canonicalize_term
+from telegram_bot.listingRecord import ListingRecord
+import threading
+import weakref
+
+# maximum number of listings kept in memory across all cached terms
+LISTING_CACHE_SIZE = 20000
+
+
+class ListingCacheEntry():
+    """
+    The latest scrape of one term as ListingRecord objects, pre-sorted by age
+    and by price.
+    """
+
+    def __init__(self, listings):
+        # the store returns listings in age order already
+        self.by_age = listings
+        self.by_price = sorted(
+            (listing for listing in listings if listing.price_cents is not None),
+            key=lambda listing: listing.price_cents,
+        )
+        self.prices = [listing.price_cents for listing in self.by_price]
+
+    def __len__(self):
+        return len(self.by_age)
+
+    # exclude_filter: optional ExcludeFilter holding the asking user's exclude words
+    def recent(self, num, exclude_filter=None):
+        return keep(self.by_age, exclude_filter)[:num]
+
+    def cheapest(self, num, exclude_filter=None):
+        return keep(self.by_price, exclude_filter)[:num]
+
+    # bounds in whole dollars, as typed by users
+    def price_range(self, min_price, max_price, exclude_filter=None):
+        lo = bisect_left(self.prices, min_price * 100)
+        hi = bisect_right(self.prices, max_price * 100)
+        return keep(self.by_price[lo:hi], exclude_filter)
+
+
+class ListingCache():
+    """
+    LRU cache of ListingCacheEntry objects keyed by search term, bounded by the
+    total number of cached listings. Call invalidate() when a scrape finishes.
+
+    A listing cached under several terms is held as one shared ListingRecord,
+    until a newer copy of it is loaded.
+    """
+
+    def __init__(self, listing_store, max_listings=LISTING_CACHE_SIZE):
+        self.listing_store = listing_store
+        self.max_listings = max_listings
+        self.entries = OrderedDict()
+        self.size = 0
+        # listing_id -> the record shared by every entry holding that listing
+        self.records = weakref.WeakValueDictionary()
+        # bumped by invalidate(), so a load that raced with it is not cached:
+        # term -> generation, and one generation for invalidating every term
+        self.generations = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, search_term):
+        term = canonicalize_term(search_term)
+        with self.lock:
+            entry = self.entries.get(term)
+            if entry is not None:
+                self.entries.move_to_end(term)
+                return entry
+            generation = (self.generation, self.generations.get(term, 0))
+
+        listings = self.listing_store.query_latest(term)
+        with self.lock:
+            entry = ListingCacheEntry([self.shared_record(listing) for listing in listings])
+            if generation != (self.generation, self.generations.get(term, 0)):
+                # a newer scrape landed while this one was read, serve it uncached
+                return entry
+            if term in self.entries:
+                self.size -= len(self.entries.pop(term))
+            self.entries[term] = entry
+            self.size += len(entry)
+            # always keep the entry just loaded, even if it is larger than the cache
+            while self.size > self.max_listings and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+        return entry
+
+    # a changed listing gets a new record, as entries holding the old one are sorted by its price
+    def shared_record(self, listing):
+        record = self.records.get(listing["listing_id"])
+        if record is None or any(getattr(record, field) != listing[field] for field in LISTING_FIELDS):
+            record = ListingRecord.from_dict(listing)
+            # whether a listing is new depends on the term, so shared records leave it out
+            record.is_new = None
+            self.records[record.listing_id] = record
+        return record
+
+    # drops one term, or every term if none is given
+    def invalidate(self, search_term=None):
+        with self.lock:
+            if search_term is None:
+                self.entries.clear()
+                self.size = 0
+                self.generation += 1
+                return
+            term = canonicalize_term(search_term)
+            self.generations[term] = self.generations.get(term, 0) + 1
+            entry = self.entries.pop(term, None)
+            if entry is not None:
+                self.size -= len(entry)
+
+    def recent(self, search_term, num, exclude_filter=None):
+        return self.get(search_term).recent(num, exclude_filter)
+
+    def cheapest(self, search_term, num, exclude_filter=None):
+        return self.get(search_term).cheapest(num, exclude_filter)
+
+    def price_range(self, search_term, min_price, max_price, exclude_filter=None):
+        return self.get(search_term).price_range(min_price, max_price, exclude_filter)
+
+
+def keep(listings, exclude_filter):
+    if exclude_filter is None:
+        return listings
+    return exclude_filter.keep(listings)
@@ -0,0 +1,69 @@
+from config.definitions import CAROUSELL_URL
+from scraper.carousellListing import format_age, format_price
+import re
+
+# characters that start an entity in Telegram's (legacy) Markdown
+MARKDOWN_SPECIAL = re.compile(r"([_*`\[])")
+
+
+class ListingRecord():
+    """
+    One listing as the bot handles it, built from the dicts sent by the scraper
+    or read from the listing store. Slots keep each record small and attribute
+    access cheap for the sort, filter and render paths.
+    """
+
+    __slots__ = (
+        "listing_id",
+        "listing_url",
+        "title",
+        "price_cents",
+        "stricken_price_cents",
+        "seller_url",
+        "posted_at",
+        "is_bumped",
+        "is_new",
+        # time the scraper first saw the listing, for the delivery delay metric
+        "seen_at",
+        # only set on price drop and bump alerts
+        "previous_price_cents",
+        "bump_count",
+        # lets the listing cache share one record between terms
+        "__weakref__",
+    )
+
+    def __init__(self, **fields):
+        for name in FIELD_NAMES:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_dict(cls, listing):
+        return cls(**listing)
+
+    @classmethod
+    def from_dicts(cls, listings):
+        return [cls(**listing) for listing in listings]
+
+    def __repr__(self):
+        return f"ListingRecord({self.listing_id}, {self.title!r}, {self.price_cents})"
+
+    # markdown message shown to users
+    def render(self, now=None):
+        age = format_age(self.posted_at, now) or "some time"
+        seller_name = escape_markdown(self.seller_url[3:-1]) if self.seller_url else "unknown"
+        seller_link = CAROUSELL_URL + self.seller_url if self.seller_url else CAROUSELL_URL
+        # broken cards can lack the link or title, like the seller
+        title = escape_markdown(self.title) if self.title else "Untitled listing"
+        link = CAROUSELL_URL + self.listing_url if self.listing_url else CAROUSELL_URL
+        return (
+            f"[{title}]({link}): S${format_price(self.price_cents)}"
+            f"\n Listed {age} ago by [{seller_name}]({seller_link})"
+        )
+
+
+# a title or seller name with "_" or "*" would otherwise fail the whole message
+def escape_markdown(text):
+    return MARKDOWN_SPECIAL.sub(r"\\\1", str(text))
+
+
+FIELD_NAMES = tuple(name for name in ListingRecord.__slots__ if name != "__weakref__")
@@ -0,0 +1,52 @@
+from collections import OrderedDict
+from config.definitions import BUMP_RENOTIFY_SECONDS, NOTIFIED_RETENTION
+from monitoring import metrics
+import threading
+import time
+
+DUPLICATES = metrics.counter(
+    "bot_duplicate_notifications_total", "Listings not pushed because the user was already sent them, by kind"
+)
+
+
+class NotificationLedger():
+    """
+    Remembers which listings each user has been pushed, so a listing matching
+    several of a user's searches, or coming up again in a later push pass, only
+    reaches them once.
+
+    A new listing is pushed once per user, a price drop once per price, so a
+    further drop still goes out, and a bump at most once per `bump_interval`.
+    Only the latest `retention` pushes are remembered, and only in memory.
+    """
+
+    def __init__(self, retention=NOTIFIED_RETENTION, bump_interval=BUMP_RENOTIFY_SECONDS):
+        self.retention = retention
+        self.bump_interval = bump_interval
+        # (user_id, kind, listing_id, price_cents or None) -> time pushed, oldest first
+        self.pushed = OrderedDict()
+        self.lock = threading.Lock()
+
+    # kind: "new", or one of the bot's ALERTS
+    def key(self, user_id, kind, listing):
+        version = listing.price_cents if kind == "price_drop" else None
+        return (user_id, kind, listing.listing_id, version)
+
+    # the listings the user has not been pushed yet, recorded as pushed now
+    def claim(self, user_id, kind, listings, now=None):
+        now = time.time() if now is None else now
+        unpushed = []
+        with self.lock:
+            for listing in listings:
+                key = self.key(user_id, kind, listing)
+                pushed_at = self.pushed.get(key)
+                if pushed_at is not None and (kind != "bump" or now - pushed_at < self.bump_interval):
+                    continue
+                self.pushed[key] = now
+                self.pushed.move_to_end(key)
+                unpushed.append(listing)
+            while len(self.pushed) > self.retention:
+                self.pushed.popitem(last=False)
+        if len(unpushed) < len(listings):
+            DUPLICATES.inc(len(listings) - len(unpushed), kind=kind)
+        return unpushed
@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from config.definitions import PUSH_WORKERS
+from monitoring import metrics
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# listing lists carried by a scrape event (see scraper/carousellEventPublisher.py)
+EVENT_FIELDS = ("new_listings", "price_drops", "bumps")
+
+COALESCED_EVENTS = metrics.counter(
+    "bot_coalesced_events_total", "Scraper events merged into a push pass that was already pending"
+)
+PASS_SECONDS = metrics.histogram("bot_push_pass_seconds", "Duration of one push pass, up to queueing its messages")
+
+
+class PushDispatcher():
+    """
+    Runs the push path on its own thread, so the bot's main thread is left to
+    the updater.
+
+    submit() only records an event. The dispatcher thread takes everything
+    recorded so far as one push pass and runs each term on a pool of `workers`
+    threads. Events arriving during a pass are merged into the next one: scrape
+    events for the same term are combined, and any number of full rescans
+    become a single one.
+    """
+
+    # push_term(term, event, rescan): pushes one term; event is its merged scrape
+    # event or None, rescan is whether its new listings should be reloaded
+    # all_terms(): every term with subscribers, for full rescans
+    def __init__(self, push_term, all_terms, workers=PUSH_WORKERS):
+        self.push_term = push_term
+        self.all_terms = all_terms
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="push")
+        self.condition = threading.Condition()
+        # term -> merged scrape event, and whether a full rescan is pending
+        self.pending_events = {}
+        self.pending_rescan = False
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="push-dispatcher", daemon=True)
+        self.thread.start()
+
+    # records a scrape event, or any other event as a request to rescan every term
+    def submit(self, event):
+        with self.condition:
+            if isinstance(event, dict) and event.get("type") == "scrape":
+                term = event["term"]
+                if term in self.pending_events:
+                    COALESCED_EVENTS.inc()
+                self.pending_events[term] = merge_events(self.pending_events.get(term), event)
+            else:
+                if self.pending_rescan:
+                    COALESCED_EVENTS.inc()
+                self.pending_rescan = True
+            self.condition.notify()
+
+    # finishes the pending pass, then stops the dispatcher thread
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+        self.pool.shutdown()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending_events and not self.pending_rescan:
+                    self.condition.wait()
+                if not self.pending_events and not self.pending_rescan:
+                    return
+                events, self.pending_events = self.pending_events, {}
+                rescan, self.pending_rescan = self.pending_rescan, False
+            with PASS_SECONDS.time():
+                self.run_pass(events, rescan)
+
+    def run_pass(self, events, rescan):
+        terms = list(events)
+        if rescan:
+            terms += [term for term in self.all_terms() if term not in events]
+        futures = {
+            self.pool.submit(self.push_term, term, events.get(term), rescan): term for term in terms
+        }
+        # the pass takes as long as its slowest term
+        for future in wait(futures).done:
+            if future.exception() is not None:
+                logger.error("Push failed for %r", futures[future], exc_info=future.exception())
+
+
+# combines two scrape events of the same term, listing by listing; either may be None
+def merge_events(earlier, later):
+    if earlier is None:
+        return later
+    if later is None:
+        return earlier
+    merged = dict(later)
+    for field in EVENT_FIELDS:
+        listings = {listing["listing_id"]: listing for listing in earlier.get(field, [])}
+        for listing in later.get(field, []):
+            previous = listings.get(listing["listing_id"])
+            if previous is not None and "previous_price_cents" in previous:
+                # a price that dropped twice is reported against the price before both drops
+                listing = dict(listing, previous_price_cents=previous["previous_price_cents"])
+            listings[listing["listing_id"]] = listing
+        merged[field] = list(listings.values())
+    return merged
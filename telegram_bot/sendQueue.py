@@ -0,0 +1,235 @@
+from collections import deque
+from config.definitions import SEND_WORKERS
+from monitoring import metrics
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# limits from the Telegram Bot API FAQ
+MESSAGE_LIMIT = 4096
+GLOBAL_MESSAGES_PER_SECOND = 30
+CHAT_MESSAGES_PER_SECOND = 1
+MAX_RETRIES = 5
+
+MESSAGES_SENT = metrics.counter("bot_messages_sent_total", "Telegram messages delivered")
+SEND_FAILURES = metrics.counter("bot_send_failures_total", "Failed Telegram sends by reason")
+SEND_SECONDS = metrics.histogram("bot_send_seconds", "Duration of one sendMessage call")
+QUEUED_SECONDS = metrics.histogram("bot_queued_seconds", "Time from enqueueing a message to its delivery")
+NOTIFICATION_DELAY = metrics.histogram(
+    "bot_notification_delay_seconds",
+    "Time from a listing first being seen by the scraper to its notification being delivered",
+    metrics.DELAY_BUCKETS,
+)
+
+
+class OutboundMessage():
+    __slots__ = ("chat_id", "text", "kwargs", "attempts", "queued_at", "seen_at", "parts")
+
+    def __init__(self, chat_id, text, kwargs, seen_at=(), parts=()):
+        self.chat_id = chat_id
+        self.text = text
+        self.kwargs = kwargs
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+        # epoch times at which the listings in this message were first seen
+        self.seen_at = seen_at
+        # (text, seen_at) of each text packed into this message, when there are several
+        self.parts = parts
+
+
+class TokenBucket():
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    # seconds until a token is available
+    def delay(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class SendQueue():
+    """
+    Outbound message queue shared by every command and the push loop.
+
+    Messages are sent by `workers` background threads at no more than
+    `global_rate` messages per second overall and `chat_rate` per chat, in order
+    within each chat. A chat waiting on its own limit (or on a flood-control
+    RetryAfter) does not hold up the other chats.
+    """
+
+    def __init__(
+        self,
+        bot,
+        global_rate=GLOBAL_MESSAGES_PER_SECOND,
+        chat_rate=CHAT_MESSAGES_PER_SECOND,
+        workers=SEND_WORKERS,
+    ):
+        self.bot = bot
+        self.chat_interval = 1 / chat_rate
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.condition = threading.Condition()
+        # chat_id -> deque of pending messages, only for chats with pending messages
+        self.pending = {}
+        # (ready_at, sequence, chat_id) for every chat in self.pending that is not being sent to
+        self.ready = []
+        self.sequence = itertools.count()
+        self.chat_next_send = {}
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self.run, name=f"send-queue-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def send_message(self, chat_id, text, seen_at=(), **kwargs):
+        self.enqueue(OutboundMessage(chat_id, text, kwargs, seen_at))
+
+    def enqueue(self, message):
+        chat_id = message.chat_id
+        with self.condition:
+            if chat_id in self.pending:
+                self.pending[chat_id].append(message)
+                return
+            self.pending[chat_id] = deque([message])
+            ready_at = max(time.monotonic(), self.chat_next_send.pop(chat_id, 0))
+            heapq.heappush(self.ready, (ready_at, next(self.sequence), chat_id))
+            self.condition.notify()
+
+    # packs the texts into as few messages as fit within Telegram's size limit
+    # seen_at: optional first-seen time of each text's listing, for the delay metric
+    def send_batched(self, chat_id, texts, separator="\n\n", seen_at=None, **kwargs):
+        for group in pack_groups(texts, separator):
+            parts = [
+                (truncate(texts[i]), (seen_at[i],) if seen_at and seen_at[i] is not None else ())
+                for i in group
+            ]
+            text = separator.join(part for part, _ in parts)
+            group_seen_at = [t for _, part_seen_at in parts for t in part_seen_at]
+            self.enqueue(OutboundMessage(
+                chat_id, text, kwargs, group_seen_at, parts=parts if len(parts) > 1 else ()
+            ))
+
+    # sends the texts of a packed message one by one, ahead of the chat's other messages
+    def unpack(self, message):
+        with self.condition:
+            self.pending[message.chat_id].extendleft(
+                OutboundMessage(message.chat_id, text, message.kwargs, part_seen_at)
+                for text, part_seen_at in reversed(message.parts)
+            )
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+    def run(self):
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                if not self.ready:
+                    self.condition.wait()
+                    continue
+                now = time.monotonic()
+                ready_at, _, chat_id = self.ready[0]
+                delay = max(ready_at - now, self.global_bucket.delay(now))
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+                heapq.heappop(self.ready)
+                self.global_bucket.take()
+                message = self.pending[chat_id].popleft()
+
+            retry_in = self.deliver(message)
+
+            with self.condition:
+                next_send = time.monotonic() + self.chat_interval
+                if retry_in is not None:
+                    self.pending[chat_id].appendleft(message)
+                    next_send = time.monotonic() + retry_in
+                if self.pending[chat_id]:
+                    heapq.heappush(self.ready, (next_send, next(self.sequence), chat_id))
+                    self.condition.notify()
+                else:
+                    del self.pending[chat_id]
+                    self.chat_next_send[chat_id] = next_send
+
+    # returns the seconds to wait before retrying, or None when done with the message
+    def deliver(self, message):
+        try:
+            with SEND_SECONDS.time():
+                self.bot.send_message(chat_id=message.chat_id, text=message.text, **message.kwargs)
+        except RetryAfter as e:
+            SEND_FAILURES.inc(reason="retry_after")
+            logger.warning("Flood control for chat %s, retrying in %ss", message.chat_id, e.retry_after)
+            return e.retry_after
+        except BadRequest as e:
+            # BadRequest is a NetworkError, but retrying will not help
+            SEND_FAILURES.inc(reason="bad_request")
+            if message.parts:
+                # e.g. one listing's markup could not be parsed, only that one should be lost
+                logger.warning("Bad request for chat %s, sending its %d parts one by one: %s",
+                               message.chat_id, len(message.parts), e)
+                self.unpack(message)
+                return None
+            logger.error("Bad request for chat %s: %s", message.chat_id, e)
+            return None
+        except NetworkError as e:
+            SEND_FAILURES.inc(reason="network")
+            message.attempts += 1
+            if message.attempts > MAX_RETRIES:
+                logger.error("Giving up on message to chat %s: %s", message.chat_id, e)
+                return None
+            return min(2 ** message.attempts, 60)
+        except TelegramError as e:
+            SEND_FAILURES.inc(reason="telegram")
+            logger.error("Could not send message to chat %s: %s", message.chat_id, e)
+            return None
+
+        MESSAGES_SENT.inc()
+        QUEUED_SECONDS.observe(time.monotonic() - message.queued_at)
+        delivered_at = time.time()
+        for seen_at in message.seen_at:
+            NOTIFICATION_DELAY.observe(delivered_at - seen_at)
+        return None
+
+
+# cuts an overlong text at a line break, so no markdown entity is cut in half
+def truncate(text, limit=MESSAGE_LIMIT):
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n", 0, limit)
+    return text[:cut] if cut > 0 else text[:limit]
+
+
+# indices of the texts that go into each message, packing as many as fit
+def pack_groups(texts, separator="\n\n", limit=MESSAGE_LIMIT):
+    groups = []
+    current = []
+    length = 0
+    for i, text in enumerate(texts):
+        text_length = min(len(text), limit)
+        if current and length + len(separator) + text_length > limit:
+            groups.append(current)
+            current = []
+        length = text_length if not current else length + len(separator) + text_length
+        current.append(i)
+    if current:
+        groups.append(current)
+    return groups
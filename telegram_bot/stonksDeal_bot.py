@@ -1,4 +1,3 @@
-import json
 from telegram.ext import (
     Updater,
     CallbackContext,
@@ -9,46 +8,41 @@ from telegram.ext import (
 )
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 import logging
-import pandas as pd
-import os
-import math
-from config.definitions import ROOT_DIR, CAROUSELL_URL, TOKEN_DIR
-from multiprocessing.connection import Listener
-
-monitored_searches = {}
-"""
-monitored searches format:
-{
-  <user_id1>: {
-    "searches": {
-      <search_term>: {
-        "max_price": <max_price>,
-        "min_price": <min_price>,
-        "exclude" : <exclude_array>,
-      },
-    }
-  }
-  <user_id2>: {
-    "searches": {
-      <search_term>: {
-        "max_price": <max_price>,
-        "min_price": <min_price>,
-        "exclude" : <exclude_array>,
-      },
-    }
-  }
-}
-"""
-
-
-load_path = os.path.join(ROOT_DIR, "data", "monitored_searches.json")
-
-if os.path.exists(load_path):
-    with open(load_path, "r", encoding="utf-8") as f:
-        monitored_searches = json.load(f)
-        print(monitored_searches)
-else:
-    print("No monitored searches file found, creating new one.")
+from config.definitions import TOKEN_DIR, TELEGRAM_API_URL, IPC_ADDRESS, BOT_METRICS_PORT, SEND_WORKERS
+from monitoring import metrics
+from scraper.carousellEventPublisher import load_ipc_authkey
+from scraper.carousellListing import format_price
+from scraper.carousellListingStore import CarousellListingStore
+from scraper.carousellSubscriptionStore import CarousellSubscriptionStore
+from telegram_bot.excludeFilter import ExcludeFilter
+from telegram_bot.listingCache import ListingCache
+from telegram_bot.listingRecord import ListingRecord
+from telegram_bot.notificationLedger import NotificationLedger
+from telegram_bot.pushDispatcher import PushDispatcher, merge_events
+from telegram_bot.sendQueue import SendQueue
+from telegram_bot.subscriptionMatcher import SubscriptionMatcher
+from multiprocessing.connection import Client, Listener
+import threading
+
+# every user's searches, shared with the scraper (see scraper/carousellSubscriptionStore.py)
+subscription_store = CarousellSubscriptionStore()
+
+listing_store = CarousellListingStore()
+listing_cache = ListingCache(listing_store)
+# a listing under several of a user's searches is only pushed to them once
+notification_ledger = NotificationLedger()
+# created in main() once the bot exists
+send_queue = None
+push_dispatcher = None
+
+EVENTS = metrics.counter("bot_events_total", "Events received from the scraper")
+MATCH_SECONDS = metrics.histogram("bot_match_seconds", "Time to match one term's listings to its subscribers")
+PUSH_SECONDS = metrics.histogram("bot_push_seconds", "Time to push one term, up to queueing its messages")
+
+# kept up to date by refresh_subscriptions()
+subscription_version = subscription_store.version()
+subscription_matcher = SubscriptionMatcher(subscription_store.all_subscriptions())
+subscription_lock = threading.Lock()
 
 
 logging.basicConfig(
@@ -71,31 +65,47 @@ search term\.\n\nTo switch between your searches, use the /switch command\.\n"
 
 
 # formatting output to look nice in telegram
-def format_message(series: pd.Series):
-    """
-    Format a pandas Series as a string.
-    """
+def format_message(listing):
+    return listing.render()
+
+
+def format_price_drop(listing):
     return (
-        "["
-        + series["title"]
-        + "]("
-        + CAROUSELL_URL
-        + series["listing_url"]
-        + ")"
-        + ": S$"
-        + series["price"].astype(str)
-        + "\n Listed "
-        + series["age"]
-        + " ago by "
-        + "["
-        + series["seller_url"][3:-1]
-        + "]("
-        + CAROUSELL_URL
-        + series["seller_url"]
-        + ")"
+        "Price drop from S$"
+        + format_price(listing.previous_price_cents)
+        + ": "
+        + format_message(listing)
     )
 
 
+def format_bump(listing):
+    times = "once" if listing.bump_count == 1 else str(listing.bump_count) + " times"
+    return "Bumped (" + times + "): " + format_message(listing)
+
+
+# alert name -> (event field, message format)
+ALERTS = {
+    "price_drop": ("price_drops", format_price_drop),
+    "bump": ("bumps", format_bump),
+}
+
+
+# queues the listings for sending, several to a message
+def send_listings(chat_id, listings, formatter=format_message):
+    send_queue.send_batched(
+        chat_id,
+        [formatter(listing) for listing in listings],
+        seen_at=[listing.seen_at for listing in listings],
+        parse_mode="Markdown",
+    )
+
+
+# the user's exclude words for one of their searches
+def user_exclude_filter(update: Update, search_term):
+    search = subscription_store.search(update.effective_user.id, search_term)
+    return ExcludeFilter([search["exclude"] if search is not None else []])
+
+
 # show the 'num' most recently posted listings in latest scrape
 def recent(update: Update, context: CallbackContext):
     if len(context.args) == 0:
@@ -117,16 +127,8 @@ def recent(update: Update, context: CallbackContext):
         return
 
     selected_search = context.user_data["selection"]
-    with open(
-        ROOT_DIR + "/data/" + selected_search.replace(" ", "_") + ".csv", "r"
-    ) as f:
-        df = pd.read_csv(f)
-        for i in range(num):
-            context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=format_message(df.iloc[i]),
-                parse_mode="Markdown",
-            )
+    exclude_filter = user_exclude_filter(update, selected_search)
+    send_listings(update.effective_chat.id, listing_cache.recent(selected_search, num, exclude_filter))
 
 
 # show the 'num' cheapest listings in latest scrape
@@ -150,16 +152,8 @@ def cheapest(update: Update, context: CallbackContext):
         return
 
     selected_search = context.user_data["selection"]
-    with open(
-        ROOT_DIR + "/data/" + selected_search.replace(" ", "_") + ".csv", "r"
-    ) as f:
-        df = pd.read_csv(f).nsmallest(num, "price")
-        for i in range(num):
-            context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=format_message(df.iloc[i]),
-                parse_mode="Markdown",
-            )
+    exclude_filter = user_exclude_filter(update, selected_search)
+    send_listings(update.effective_chat.id, listing_cache.cheapest(selected_search, num, exclude_filter))
 
 
 # show all listings within range a, b
@@ -185,17 +179,8 @@ def price_range(update: Update, context: CallbackContext):
     a = int(context.args[0])
     b = int(context.args[1])
     selected_search = context.user_data["selection"]
-    with open(
-        ROOT_DIR + "/data/" + selected_search.replace(" ", "_") + ".csv", "r"
-    ) as f:
-        df = pd.read_csv(f)
-        df = df[(df["price"] >= a) & (df["price"] <= b)]
-        for i in range(len(df)):
-            context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=format_message(df.iloc[i]),
-                parse_mode="Markdown",
-            )
+    exclude_filter = user_exclude_filter(update, selected_search)
+    send_listings(update.effective_chat.id, listing_cache.price_range(selected_search, a, b, exclude_filter))
 
 
 # add a new search to the list of monitored searches
@@ -251,22 +236,7 @@ def add(update: Update, context: CallbackContext):
         #     return
 
         # valid results found, add to list of monitored searches
-        if user_id in monitored_searches:
-            monitored_searches[user_id]["searches"][new_search] = {
-                "max_price": max_price,
-                "min_price": min_price,
-                "exclude": exclude,
-            }
-        else:
-            monitored_searches[user_id] = {
-                "searches": {
-                    new_search: {
-                        "max_price": max_price,
-                        "min_price": min_price,
-                        "exclude": exclude,
-                    }
-                }
-            }
+        subscription_store.upsert(user_id, new_search, min_price, max_price, exclude)
 
         context.user_data["selection"] = new_search
 
@@ -289,13 +259,13 @@ def add(update: Update, context: CallbackContext):
             text=output_str,
         )
 
-        save_monitored_searches()
+        refresh_subscriptions()
 
 
 # switch from one monitored search to another
 def switch(update: Update, context: CallbackContext):
-    user_id = str(update.effective_user.id)
-    if user_id not in monitored_searches:
+    searches = subscription_store.user_searches(update.effective_user.id)
+    if not searches:
         context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="No monitored searches found. Use /add to add one.",
@@ -303,7 +273,7 @@ def switch(update: Update, context: CallbackContext):
         return
     keyboard = [
         [InlineKeyboardButton(x, callback_data="<switch> " + str(x))]
-        for x in monitored_searches[user_id]["searches"]
+        for x in searches
     ]
     update.message.reply_text(
         "Please select one of the following searches: ",
@@ -329,8 +299,8 @@ def switch_button(update: Update, context: CallbackContext):
 
 # removes a search from monitored searches
 def remove(update: Update, context: CallbackContext):
-    user_id = str(update.effective_chat.id)
-    if user_id not in monitored_searches:
+    searches = subscription_store.user_searches(update.effective_chat.id)
+    if not searches:
         context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="No monitored searches found. Use /add to add one.",
@@ -338,7 +308,7 @@ def remove(update: Update, context: CallbackContext):
         return
     keyboard = [
         [InlineKeyboardButton(x, callback_data="<remove> " + str(x))]
-        for x in monitored_searches[user_id]["searches"]
+        for x in searches
     ]
     update.message.reply_text(
         "Please select one of the following searches to remove: ",
@@ -356,13 +326,49 @@ def remove_button(update: Update, context: CallbackContext):
     # remove <remove> marker from data
     selection = " ".join(query.data.split()[1:])
 
-    monitored_searches[str(update.effective_chat.id)]["searches"].pop(selection, None)
-    save_monitored_searches()
-    os.remove(ROOT_DIR + "/data/" + selection.replace(" ", "_") + ".csv")
+    subscription_store.delete(update.effective_chat.id, selection)
+    refresh_subscriptions()
 
     query.edit_message_text(text=f"Search removed: {selection}")
 
 
+# turn price drop and bump alerts on or off for the selected search
+def alerts(update: Update, context: CallbackContext):
+    user_id = str(update.effective_user.id)
+    selection = context.user_data.get("selection")
+    search = subscription_store.search(user_id, selection) if selection is not None else None
+    if search is None:
+        context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="Please select a search term first. Hint: /switch",
+        )
+        return
+    search_alerts = search["alerts"]
+
+    if len(context.args) == 2 and context.args[0] in ALERTS and context.args[1] in ("on", "off"):
+        alert = context.args[0]
+        if context.args[1] == "on" and alert not in search_alerts:
+            search_alerts.append(alert)
+        elif context.args[1] == "off" and alert in search_alerts:
+            search_alerts.remove(alert)
+        subscription_store.set_alerts(user_id, selection, search_alerts)
+        refresh_subscriptions()
+    elif len(context.args) != 0:
+        context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="Usage: /alerts OR /alerts <" + "|".join(ALERTS) + "> <on|off>",
+        )
+        return
+
+    context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text="Alerts for '"
+        + selection
+        + "': "
+        + (", ".join(search_alerts) if search_alerts else "none"),
+    )
+
+
 # catch all
 def unknown(update: Update, context: CallbackContext):
     context.bot.send_message(
@@ -371,94 +377,115 @@ def unknown(update: Update, context: CallbackContext):
     )
 
 
-# save monitored_searches
-def save_monitored_searches():
-    if not os.path.exists(os.path.join(ROOT_DIR, "data")):
-        os.mkdir(os.path.join(ROOT_DIR, "data"))
-
-    save_path = os.path.join(ROOT_DIR, "data", "monitored_searches.json")
-
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(monitored_searches, f, ensure_ascii=False, indent=4)
-
-
-# checks if bot should send the update to the user
-def should_send_update(row, user_id, search_term):
-    if 'age' not in row:
-        return False
-    age = row["age"].split()
-
-    # checks if the listing is new (< 1min old)
-    is_recent = "second" in age[1]
-
-    # checks if the listing is within the price range
-    max_price = monitored_searches[user_id]["searches"][search_term]["max_price"]
-    max_price = float("inf") if max_price is None else max_price
-    min_price = monitored_searches[user_id]["searches"][search_term]["min_price"]
-    min_price = 0 if min_price is None else min_price
-
-    price = row['price']
-    if math.isnan(price):
-        return False
-    is_within_price_range = min_price <= int(price) <= max_price
-
-    # print(
-    #    row["title"]
-    #    + " is "
-    #    + ("new" if is_recent else "old")
-    #    + " and "
-    #    + ("within" if is_within_price_range else "not within")
-    # )
-
-    return is_recent and is_within_price_range
-
-
-# update all users on new listings
-def push_to_all_users(updater):
-    for user_id in monitored_searches:
-        for search in monitored_searches[user_id]["searches"]:
-            with open(
-                ROOT_DIR + "/data/" + search.replace(" ", "_") + ".csv", "r"
-            ) as f:
-                df = pd.read_csv(f)
-                m = df.apply(
-                    lambda row: should_send_update(row, str(user_id), search), axis=1
-                )
-                listings_worth_seeing = df[m]
-                print("listings_worth_seeing: ", listings_worth_seeing)
-                for i in range(len(listings_worth_seeing)):
-                    updater.bot.send_message(
-                        chat_id=user_id,
-                        text=format_message(listings_worth_seeing.iloc[i]),
-                        parse_mode="Markdown",
-                    )
-
-
-# run when push_to_users script is run by crontab
-def push_notification_checker(updater):
-    listener = Listener(("localhost", 6000), authkey=b"password")
-    running = True
-    while running:
+# applies the subscription changes made since the last refresh, by this
+# process or another one, to the matcher
+def refresh_subscriptions():
+    global subscription_version
+    with subscription_lock:
+        changes = subscription_store.changed_since(subscription_version)
+        if not changes:
+            return
+        for term in {change["term"] for change in changes}:
+            subscription_matcher.set_term(term, subscription_store.term_subscriptions(term))
+        subscription_version = max(change["version"] for change in changes)
+
+
+# push the new listings of one term to all of its subscribers
+def push_new_listings(search_term, new_listings):
+    with MATCH_SECONDS.time():
+        matches = subscription_matcher.match(search_term, new_listings)
+    for user_id, listings_worth_seeing in matches.items():
+        listings_worth_seeing = notification_ledger.claim(user_id, "new", listings_worth_seeing)
+        if not listings_worth_seeing:
+            continue
+        print("listings_worth_seeing: ", user_id, len(listings_worth_seeing))
+        send_listings(user_id, listings_worth_seeing)
+
+
+# push price drops and bumps to the subscribers who turned on that alert
+def push_alerts(search_term, alert, listings):
+    with MATCH_SECONDS.time():
+        matches = subscription_matcher.match(search_term, listings, alert=alert)
+    for user_id, changed_listings in matches.items():
+        changed_listings = notification_ledger.claim(user_id, alert, changed_listings)
+        if changed_listings:
+            send_listings(user_id, changed_listings, ALERTS[alert][1])
+
+
+# push one term's merged scrape event, run by the push dispatcher's workers
+def push_term(search_term, event, rescan):
+    with PUSH_SECONDS.time():
+        if rescan:
+            # the term's new listings are loaded once for all of its subscribers
+            event = merge_events(event, {"new_listings": listing_store.new_listings(search_term)})
+        push_new_listings(search_term, ListingRecord.from_dicts(event["new_listings"]))
+        for alert, (field, _) in ALERTS.items():
+            push_alerts(search_term, alert, ListingRecord.from_dicts(event.get(field, [])))
+
+
+# records the event for the push dispatcher, which merges it with any other
+# event still waiting for a push pass
+def handle_event(event):
+    EVENTS.inc()
+    refresh_subscriptions()
+    if isinstance(event, dict) and event.get("type") == "scrape":
+        # only the scraped term changed, and its new listings come with the event
+        listing_cache.invalidate(event["term"])
+    else:
+        # e.g. "Updated" from push_to_users.py, rescan every term
+        listing_cache.invalidate()
+    push_dispatcher.submit(event)
+
+
+# reads events from one scraper connection until it is closed
+def handle_connection(conn, stop_listening):
+    with conn:
+        while True:
+            try:
+                event = conn.recv()
+            except (EOFError, OSError):
+                return
+            if event == "stop":
+                stop_listening.set()
+                # wake up the accept() in push_notification_checker
+                Client(IPC_ADDRESS, authkey=load_ipc_authkey()).close()
+                return
+            try:
+                handle_event(event)
+            except Exception as e:
+                print(e)
+
+
+# receives scrape events from the scraper, one thread per connection
+def push_notification_checker():
+    listener = Listener(IPC_ADDRESS, authkey=load_ipc_authkey())
+    stop_listening = threading.Event()
+    while not stop_listening.is_set():
         try:
             conn = listener.accept()
-            message = conn.recv()
-            print(message)
-            if message == "stop":
-                running = False
-                break
-            else:
-                push_to_all_users(updater)
-            conn.close()
         except Exception as e:
             print(e)
-            pass
+            continue
+        threading.Thread(
+            target=handle_connection, args=(conn, stop_listening), daemon=True
+        ).start()
     listener.close()
 
 
 def main():
     with open(TOKEN_DIR, "r") as f:
         TOKEN = f.readline().strip()
-    updater = Updater(token=TOKEN)
+    # the default pool only covers the updater's own threads, the send queue's
+    # workers need a connection each on top of those
+    updater = Updater(
+        token=TOKEN,
+        base_url=TELEGRAM_API_URL,
+        request_kwargs={"con_pool_size": SEND_WORKERS + 8},
+    )
+
+    global send_queue, push_dispatcher
+    send_queue = SendQueue(updater.bot)
+    push_dispatcher = PushDispatcher(push_term, subscription_matcher.terms)
     dispatcher = updater.dispatcher
 
     start_handler = CommandHandler("start", start)
@@ -470,6 +497,7 @@ def main():
     switch_button_hanlder = CallbackQueryHandler(switch_button, pattern="^<switch>")
     remove_handler = CommandHandler("remove", remove)
     remove_button_hanlder = CallbackQueryHandler(remove_button, pattern="^<remove>")
+    alerts_handler = CommandHandler("alerts", alerts)
     unknown_handler = MessageHandler(Filters.command, unknown)
 
     all_handlers = [
@@ -482,14 +510,19 @@ def main():
         switch_button_hanlder,
         remove_handler,
         remove_button_hanlder,
+        alerts_handler,
         unknown_handler,
     ]
     for handler in all_handlers:
         dispatcher.add_handler(handler)
 
+    metrics.start_metrics_export("bot", BOT_METRICS_PORT)
     updater.start_polling()
-    push_notification_checker(updater)
+    # the listener and the pushes run off the main thread, which idle() needs
+    # for its signal handlers
+    threading.Thread(target=push_notification_checker, name="ipc-listener", daemon=True).start()
     updater.idle()
+    push_dispatcher.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,82 @@
+from scraper.carousellSearchPlanner import canonicalize_term
+from telegram_bot.excludeFilter import ExcludeFilter
+import numpy as np
+
+
+class SubscriptionMatcher():
+    """
+    Inverted index from canonical search term to the subscriptions on it, with
+    their price bounds held as arrays so all of a term's subscriptions are
+    matched against its new listings in one vectorized pass. Each term's
+    exclude words are compiled into a single ExcludeFilter.
+    """
+
+    # subscriptions: rows from CarousellSubscriptionStore
+    def __init__(self, subscriptions=()):
+        self.index = {}
+        by_term = {}
+        for subscription in subscriptions:
+            by_term.setdefault(subscription["term"], []).append(subscription)
+        for term, term_subscriptions in by_term.items():
+            self.set_term(term, term_subscriptions)
+
+    # replaces every subscription on one canonical term
+    def set_term(self, term, subscriptions):
+        if not subscriptions:
+            self.index.pop(term, None)
+            return
+        self.index[term] = (
+            [str(subscription["user_id"]) for subscription in subscriptions],
+            np.array(
+                [0 if s["min_price"] is None else s["min_price"] for s in subscriptions], dtype=float
+            ),
+            np.array(
+                [np.inf if s["max_price"] is None else s["max_price"] for s in subscriptions], dtype=float
+            ),
+            ExcludeFilter([subscription["exclude"] for subscription in subscriptions]),
+            [frozenset(subscription["alerts"]) for subscription in subscriptions],
+        )
+
+    def terms(self):
+        return list(self.index)
+
+    def match(self, search_term, listings, alert=None):
+        """
+        listings: ListingRecord objects
+        Returns {user_id: [listing, ...]} for every subscription on the term whose
+        price bounds contain the listing's price and whose exclude words are not
+        in the listing's title. With an alert ("price_drop" or "bump"), only the
+        subscriptions that turned that alert on are matched.
+        """
+        term = canonicalize_term(search_term)
+        if term not in self.index or len(listings) == 0:
+            return {}
+        user_ids, min_prices, max_prices, exclude_filter, alerts = self.index[term]
+        if alert is not None and not any(alert in subscription_alerts for subscription_alerts in alerts):
+            return {}
+
+        # sort the listings by price once, then each subscription is a slice
+        priced = [listing for listing in listings if listing.price_cents is not None]
+        priced.sort(key=lambda listing: listing.price_cents)
+        # prices are compared as whole dollars
+        prices = np.array([listing.price_cents for listing in priced], dtype=np.int64) // 100
+        starts = np.searchsorted(prices, min_prices, side="left")
+        ends = np.searchsorted(prices, max_prices, side="right")
+        # every title is scanned once for all of the term's exclude words
+        title_masks = exclude_filter.title_masks([listing.title for listing in priced])
+
+        matches = {}
+        for subscriber, (user_id, start, end) in enumerate(zip(user_ids, starts, ends)):
+            if start >= end or (alert is not None and alert not in alerts[subscriber]):
+                continue
+            keep = exclude_filter.keep_mask(title_masks[start:end], subscriber)
+            # a user may hold several spellings of the same term
+            user_matches = matches.setdefault(user_id, {})
+            for listing, kept in zip(priced[start:end], keep):
+                if kept:
+                    user_matches.setdefault(listing.listing_id, listing)
+        return {
+            user_id: list(user_matches.values())
+            for user_id, user_matches in matches.items()
+            if user_matches
+        }